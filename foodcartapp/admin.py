@@ -1,11 +1,42 @@
+from datetime import date
+
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import redirect, reverse
 from django.templatetags.static import static
+from django.urls import path
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 from django.utils.http import url_has_allowed_host_and_scheme
+from phonenumber_field.phonenumber import PhoneNumber, to_python
+from star_burger.db import get_read_database
+
+from .exports import EXPORT_FORMATS, export_orders, filter_orders
+from .models import (Order, OrderItem, Product, ProductCategory, QueuedOrder,
+                     Restaurant, RestaurantMenuItem)
+from .thumbnails import get_renditions
+
 
-from .models import (Order, OrderItem, Product, ProductCategory, Restaurant,
-                     RestaurantMenuItem)
+ORDER_PRICE_RANGES = [(0, 500), (500, 1000), (1000, 2000), (2000, None)]
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def render_thumbnail_html(image, size_name, max_height):
+    rendition = get_renditions(image).get(size_name)
+    if not rendition:
+        return format_html('<img src="{src}" style="max-height: {height}px;"/>', src=image.url, height=max_height)
+    return format_html(
+        '<picture>{webp}<img src="{src}" style="max-height: {height}px;"/></picture>',
+        webp=format_html('<source srcset="{}" type="image/webp">', rendition['webp']) if 'webp' in rendition else '',
+        src=rendition['jpeg'],
+        height=max_height,
+    )
 
 
 class RestaurantMenuItemInline(admin.TabularInline):
@@ -89,14 +120,14 @@ class ProductAdmin(admin.ModelAdmin):
     def get_image_preview(self, obj):
         if not obj.image:
             return 'выберите картинку'
-        return format_html('<img src="{url}" style="max-height: 200px;"/>', url=obj.image.url)
+        return render_thumbnail_html(obj.image, 'medium', 200)
     get_image_preview.short_description = 'превью'
 
     def get_image_list_preview(self, obj):
         if not obj.image or not obj.id:
             return 'нет картинки'
         edit_url = reverse('admin:foodcartapp_product_change', args=(obj.id,))
-        return format_html('<a href="{edit_url}"><img src="{src}" style="max-height: 50px;"/></a>', edit_url=edit_url, src=obj.image.url)
+        return format_html('<a href="{edit_url}">{image}</a>', edit_url=edit_url, image=render_thumbnail_html(obj.image, 'small', 50))
     get_image_list_preview.short_description = 'превью'
 
 
@@ -107,17 +138,65 @@ class ProductAdmin(admin.ModelAdmin):
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
-    fields = ['product', 'quantity', 'price', 'fixed_price']
+    fields = ['product', 'product_name', 'quantity', 'price', 'fixed_price']
+    readonly_fields = ['product_name']
+    raw_id_fields = ['product']
     extra = 1
 
 
+class PriceRangeFilter(admin.SimpleListFilter):
+    title = 'стоимость'
+    parameter_name = 'price'
+
+    def lookups(self, request, model_admin):
+        return [
+            (f'{low}-{high or ""}', f'от {low}' if high is None else f'{low}–{high}')
+            for low, high in ORDER_PRICE_RANGES
+        ]
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        low, high = self.value().split('-')
+        queryset = queryset.filter(fixed_total_price__gte=low)
+        if high:
+            queryset = queryset.filter(fixed_total_price__lt=high)
+        return queryset
+
+
+class ApproximateCountPaginator(Paginator):
+    """Paginator which does not count every row of a large table.
+
+    The unfiltered table size is taken from the Postgres statistics and
+    the count of a filtered queryset stops at MAX_EXACT_COUNT rows.
+    """
+    MAX_EXACT_COUNT = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if not queryset.query.where and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] > self.MAX_EXACT_COUNT:
+                return int(row[0])
+        return queryset.order_by()[:self.MAX_EXACT_COUNT].count()
+
+
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'created_at', 'firstname', 'lastname',
                     'phonenumber', 'address', 'fixed_total_price', 'status', 'comments', 'call_date', 'delivery_date', 'payment_method', 'restaurant']
-    search_fields = ['firstname', 'lastname',
-                     'phonenumber', 'address', 'comments']
-    list_filter = ['fixed_total_price', 'status', 'payment_method']
-    readonly_fields = ('created_at',)
+    list_select_related = ['restaurant']
+    search_fields = ['^lastname', '^firstname', 'address']
+    list_filter = [PriceRangeFilter, 'status', 'payment_method']
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    readonly_fields = ('created_at', 'fixed_total_price')
     inlines = [OrderItemInline]
 
     fieldsets = (
@@ -126,6 +205,54 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_urls(self):
+        return [
+            path(
+                'export/',
+                self.admin_site.admin_view(self.export_view),
+                name='foodcartapp_order_export',
+            ),
+        ] + super().get_urls()
+
+    def get_search_results(self, request, queryset, search_term):
+        """Look a phone number up by the index, other terms by name and address."""
+        phonenumber = to_python(search_term.strip(), region='RU')
+        if isinstance(phonenumber, PhoneNumber) and phonenumber.is_valid():
+            return queryset.filter(phonenumber=phonenumber), False
+        return super().get_search_results(request, queryset, search_term)
+
+    def export_view(self, request):
+        """Stream orders as CSV or JSON Lines.
+
+        Query parameters: format (csv or jsonl), from and to as YYYY-MM-DD,
+        status, possibly repeated.
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return HttpResponseBadRequest('Unknown export format')
+        try:
+            date_from, date_to = (
+                date.fromisoformat(request.GET[param]) if request.GET.get(param) else None
+                for param in ['from', 'to']
+            )
+        except ValueError:
+            return HttpResponseBadRequest('Dates must be in YYYY-MM-DD format')
+
+        # the response is streamed after the view returns, so the replica
+        # is chosen explicitly instead of with use_replica
+        orders = (
+            filter_orders(date_from, date_to, request.GET.getlist('status'))
+            .using(get_read_database())
+        )
+        response = StreamingHttpResponse(
+            export_orders(orders, export_format),
+            content_type=EXPORT_CONTENT_TYPES[export_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="orders.{export_format}"'
+        return response
+
     def save_model(self, request, obj, form, change):
         if 'restaurant' in form.changed_data:
             obj.status = 'собирается'
@@ -144,3 +271,10 @@ class OrderAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Order, OrderAdmin)
+
+
+@admin.register(QueuedOrder)
+class QueuedOrderAdmin(admin.ModelAdmin):
+    list_display = ['token', 'status', 'created_at', 'processed_at', 'order']
+    list_filter = ['status']
+    readonly_fields = ['token', 'created_at', 'processed_at', 'order']
@@ -0,0 +1,155 @@
+from collections import defaultdict
+from threading import Lock
+
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from star_burger.db import use_primary
+
+from .catalogue import get_catalogue_version
+from .models import Product, Restaurant, RestaurantMenuItem
+
+AVAILABILITY_MATRIX_KEY = 'availability:matrix:{version}'
+MENU_INDEX_KEY = 'availability:menu-index:{version}'
+PRODUCT_TABLE_KEY = 'availability:product-table:{version}'
+CATALOGUE_INDEX_TIMEOUT = 24 * 60 * 60
+
+
+def get_restaurants_by_product():
+    """Map each product id to the set of restaurant ids selling it.
+
+    The whole menu availability is loaded with a single query.
+    """
+    restaurants_by_product = defaultdict(set)
+    menu_items = (
+        RestaurantMenuItem.objects
+        .filter(availability=True)
+        .values_list('product_id', 'restaurant_id')
+    )
+    for product_id, restaurant_id in menu_items:
+        restaurants_by_product[product_id].add(restaurant_id)
+    return restaurants_by_product
+
+
+def get_eligible_restaurant_ids(product_ids, restaurants_by_product):
+    """Return ids of the restaurants that can cook all given products."""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return set()
+    return set.intersection(*(
+        restaurants_by_product.get(product_id, set())
+        for product_id in product_ids
+    ))
+
+
+def build_menu_index():
+    """Map each restaurant id to the frozenset of product ids it sells."""
+    menu_index = defaultdict(set)
+    menu_items = (
+        RestaurantMenuItem.objects
+        .filter(availability=True)
+        .values_list('restaurant_id', 'product_id')
+    )
+    for restaurant_id, product_id in menu_items:
+        menu_index[restaurant_id].add(product_id)
+    return {
+        restaurant_id: frozenset(product_ids)
+        for restaurant_id, product_ids in menu_index.items()
+    }
+
+
+def build_product_table():
+    """Map each product id to its name, price and availability.
+
+    A product is available when at least one restaurant sells it.
+    """
+    available_menu_items = RestaurantMenuItem.objects.filter(
+        product=OuterRef('pk'),
+        availability=True,
+    )
+    products = (
+        Product.objects
+        .annotate(available=Exists(available_menu_items))
+        .values_list('id', 'name', 'price', 'available')
+    )
+    return {
+        product_id: {'name': name, 'price': price, 'available': available}
+        for product_id, name, price, available in products
+    }
+
+
+class CatalogueIndex:
+    """Process-wide copy of data derived from the catalogue.
+
+    Every product or menu item change moves the catalogue to a new version,
+    so the data is keyed by the catalogue version and is rebuilt, or loaded
+    from the shared cache, only once per version in each process.
+    """
+
+    def __init__(self, key, build):
+        self.key = key
+        self.build = build
+        self.lock = Lock()
+        self.index = None
+        self.version = None
+
+    def get(self):
+        # the version and the data are both read from the default database,
+        # data built from a lagging replica would be cached as the newest
+        with use_primary():
+            token, modified_at = get_catalogue_version()
+            with self.lock:
+                if self.index is None or self.version != token:
+                    key = self.key.format(version=token)
+                    index = cache.get(key)
+                    if index is None:
+                        index = self.build()
+                        cache.set(key, index, CATALOGUE_INDEX_TIMEOUT)
+                    self.index = index
+                    self.version = token
+                return self.index
+
+
+class MenuIndex(CatalogueIndex):
+    def get_product_ids(self, restaurant_id):
+        return self.get().get(restaurant_id, frozenset())
+
+
+def build_availability_matrix():
+    """Build the product availability matrix from the database.
+
+    Restaurants are ordered by id and each product row is an int bitset
+    where bit N tells whether the N-th restaurant sells the product.
+    Restaurants added after the catalogue version was built have no column
+    until the next version, which their first menu item brings anyway.
+    """
+    restaurant_ids = list(
+        Restaurant.objects.order_by('id').values_list('id', flat=True)
+    )
+    positions = {
+        restaurant_id: position
+        for position, restaurant_id in enumerate(restaurant_ids)
+    }
+    rows = defaultdict(int)
+    menu_items = (
+        RestaurantMenuItem.objects
+        .filter(availability=True)
+        .values_list('product_id', 'restaurant_id')
+    )
+    for product_id, restaurant_id in menu_items:
+        if restaurant_id in positions:
+            rows[product_id] |= 1 << positions[restaurant_id]
+    return {
+        'restaurant_ids': restaurant_ids,
+        'rows': dict(rows),
+    }
+
+
+def unpack_availability(row, positions):
+    return [bool(row >> position & 1) for position in positions]
+
+
+menu_index = MenuIndex(MENU_INDEX_KEY, build_menu_index)
+product_table = CatalogueIndex(PRODUCT_TABLE_KEY, build_product_table)
+availability_matrix = CatalogueIndex(
+    AVAILABILITY_MATRIX_KEY, build_availability_matrix
+)
@@ -0,0 +1,44 @@
+import math
+import statistics
+from contextlib import contextmanager
+from timeit import default_timer
+
+from django.test.utils import (setup_databases, setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+
+
+@contextmanager
+def temporary_database(verbosity=0):
+    """Run the block against a throwaway copy of the database.
+
+    Benchmarks create lots of synthetic rows, so they must never touch
+    the real database.
+    """
+    setup_test_environment(debug=False)
+    old_config = setup_databases(verbosity, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity)
+        teardown_test_environment()
+
+
+def measure(function, repeat):
+    """Call function repeat times and return timings in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started_at = default_timer()
+        function()
+        timings.append((default_timer() - started_at) * 1000)
+    return timings
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        'runs': len(timings),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[max(0, math.ceil(len(timings) * 0.95) - 1)], 3),
+        'max_ms': round(timings[-1], 3),
+    }
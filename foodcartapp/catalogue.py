@@ -0,0 +1,191 @@
+import gzip
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+
+from .models import CatalogueChange, Product
+from .thumbnails import get_renditions
+
+CATALOGUE_VERSION_KEY = 'catalogue:version'
+MENU_SNAPSHOT_KEY = 'catalogue:menu:{version}:{variant}'
+MENU_CONTENT_TYPES = {
+    'json': 'application/json',
+    'msgpack': 'application/msgpack',
+}
+MENU_SNAPSHOT_TIMEOUT = 24 * 60 * 60
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+CHANGES_SAFETY_WINDOW = timedelta(minutes=1)
+
+
+def get_catalogue_version():
+    """Return the current catalogue version as a (token, modified_at) pair.
+
+    The token is the id of the latest CatalogueChange, so it grows every
+    time a product, a category or a menu item is saved or deleted. It is
+    used as a cache key, as an ETag and as a cursor for the delta sync.
+
+    A change clears the cached version only in the cache of the process
+    which made it, so the version also expires after CATALOGUE_VERSION_TTL
+    for other processes in case the cache is not shared.
+    """
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        last_change = CatalogueChange.objects.order_by('-id').first()
+        if last_change:
+            version = (str(last_change.id), last_change.created_at)
+        else:
+            version = ('0', EPOCH)
+        cache.set(CATALOGUE_VERSION_KEY, version, settings.CATALOGUE_VERSION_TTL)
+    return version
+
+
+def bump_catalogue_version(product_ids=None, kind=CatalogueChange.CHANGED):
+    """Log changed products and move the catalogue to a new version.
+
+    Without product_ids the whole catalogue is considered changed,
+    e.g. after bulk operations which bypass model signals.
+    """
+    if product_ids is None:
+        changes = [CatalogueChange(kind=CatalogueChange.RESET)]
+    else:
+        changes = [
+            CatalogueChange(product_id=product_id, kind=kind)
+            for product_id in set(product_ids)
+        ]
+    if not changes:
+        return
+    CatalogueChange.objects.bulk_create(changes)
+    transaction.on_commit(lambda: cache.delete(CATALOGUE_VERSION_KEY))
+
+
+def get_catalogue_changes(since):
+    """Return (changed products, removed product ids) since the version.
+
+    Return None when the change log can not tell, i.e. the catalogue
+    was reset or the log is pruned past the version, so the client must
+    reload the full menu.
+
+    Ids are taken when a change is inserted, not when it is committed, so
+    a change with an id below `since` may become visible after the client
+    got `since`. Changes made up to CHANGES_SAFETY_WINDOW before the
+    version are therefore returned again.
+    """
+    if since <= 0:
+        return None
+    last_seen_change = CatalogueChange.objects.filter(id__lte=since).order_by('-id').first()
+    if last_seen_change is None:
+        return None
+    changes = CatalogueChange.objects.filter(
+        Q(id__gt=since)
+        | Q(id__lt=since, created_at__gte=last_seen_change.created_at - CHANGES_SAFETY_WINDOW)
+    )
+    # resets are not replayed, or every poll in the window would reset
+    if changes.filter(id__gt=since, kind=CatalogueChange.RESET).exists():
+        return None
+
+    product_ids = set(changes.values_list('product_id', flat=True)) - {None}
+    products = (
+        Product.objects
+        .select_related('category')
+        .available()
+        .filter(id__in=product_ids)
+        .order_by('id')
+    )
+    changed_products = [serialize_product(product) for product in products]
+    removed_product_ids = sorted(product_ids - {product['id'] for product in changed_products})
+    return changed_products, removed_product_ids
+
+
+def serialize_product(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'special_status': product.special_status,
+        'description': product.description,
+        'category': {
+            'id': product.category.id,
+            'name': product.category.name,
+        } if product.category else None,
+        'image': product.image.url if product.image else None,
+        'thumbnails': get_renditions(product.image),
+    }
+
+
+def get_available_formats():
+    if msgpack is None:
+        return ['json']
+    return ['json', 'msgpack']
+
+
+def get_available_encodings():
+    encodings = ['gzip', 'identity']
+    if brotli is not None:
+        encodings.insert(0, 'br')
+    return encodings
+
+
+def build_menu():
+    products = Product.objects.select_related('category').available()
+    return [serialize_product(product) for product in products]
+
+
+def encode_menu(menu, menu_format, pretty=False):
+    # JSON round trip turns decimals into strings for every format
+    body = json.dumps(
+        menu,
+        cls=DjangoJSONEncoder,
+        ensure_ascii=False,
+        indent=4 if pretty else None,
+        separators=None if pretty else (',', ':'),
+    ).encode('utf-8')
+    if menu_format == 'msgpack':
+        return msgpack.packb(json.loads(body))
+    return body
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    return body
+
+
+def get_menu_snapshot(menu_format='json', encoding='identity', pretty=False,
+                      product_ids=None, scope='all'):
+    """Return (body, version_token, modified_at) of the serialized menu.
+
+    Every format and encoding of the menu is built once per catalogue
+    version and then served from the cache as-is. A menu limited to
+    product_ids, e.g. of a single restaurant, is cached under its scope.
+    """
+    token, modified_at = get_catalogue_version()
+    variant = f'{menu_format}-pretty' if pretty else menu_format
+    key = MENU_SNAPSHOT_KEY.format(version=token, variant=f'{scope}:{variant}:{encoding}')
+    body = cache.get(key)
+    if body is None:
+        menu_key = MENU_SNAPSHOT_KEY.format(version=token, variant='data')
+        menu = cache.get(menu_key)
+        if menu is None:
+            menu = build_menu()
+            cache.set(menu_key, menu, MENU_SNAPSHOT_TIMEOUT)
+        if product_ids is not None:
+            menu = [product for product in menu if product['id'] in product_ids]
+        body = compress(encode_menu(menu, menu_format, pretty), encoding)
+        cache.set(key, body, MENU_SNAPSHOT_TIMEOUT)
+    return body, token, modified_at
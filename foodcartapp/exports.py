@@ -0,0 +1,108 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+from itertools import groupby
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import Order, OrderItem
+
+ORDER_FIELDS = [
+    'id',
+    'created_at',
+    'status',
+    'payment_method',
+    'firstname',
+    'lastname',
+    'phonenumber',
+    'address',
+    'fixed_total_price',
+    'restaurant_id',
+    'comments',
+]
+ORDER_ITEM_FIELDS = ['product_id', 'product_name', 'quantity', 'fixed_price']
+EXPORT_FORMATS = ['csv', 'jsonl']
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object returning what is written, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def filter_orders(date_from=None, date_to=None, statuses=None):
+    """Filter orders by creation date, both ends inclusive, and status."""
+    filters = {}
+    if date_from:
+        filters['created_at__gte'] = timezone.make_aware(datetime.combine(date_from, time.min))
+    if date_to:
+        filters['created_at__lt'] = timezone.make_aware(
+            datetime.combine(date_to + timedelta(days=1), time.min)
+        )
+    if statuses:
+        filters['status__in'] = statuses
+    return Order.objects.filter(**filters)
+
+
+def iter_orders_with_items(orders):
+    """Yield (order, items) pairs of dicts, keeping memory use constant.
+
+    Orders and their items are read by two server-side cursors, both sorted
+    by order id, and merged on the fly.
+    """
+    order_rows = (
+        orders.order_by('id')
+        .values_list(*ORDER_FIELDS)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    item_rows = (
+        OrderItem.objects
+        .using(orders.db)
+        .filter(order__in=orders.values('id'))
+        .order_by('order_id', 'id')
+        .values_list('order_id', *ORDER_ITEM_FIELDS)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    items_by_order = groupby(item_rows, key=lambda row: row[0])
+    next_items = next(items_by_order, None)
+
+    for order_row in order_rows:
+        order = dict(zip(ORDER_FIELDS, order_row))
+        while next_items is not None and next_items[0] < order['id']:
+            next_items = next(items_by_order, None)
+        items = []
+        if next_items is not None and next_items[0] == order['id']:
+            items = [dict(zip(ORDER_ITEM_FIELDS, row[1:])) for row in next_items[1]]
+            next_items = next(items_by_order, None)
+        yield order, items
+
+
+def iter_csv(orders):
+    """Yield CSV lines, one per order item."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(ORDER_FIELDS + ORDER_ITEM_FIELDS)
+    for order, items in iter_orders_with_items(orders):
+        order_values = [order[field] for field in ORDER_FIELDS]
+        for item in items or [dict.fromkeys(ORDER_ITEM_FIELDS, '')]:
+            yield writer.writerow(order_values + [item[field] for field in ORDER_ITEM_FIELDS])
+
+
+def iter_jsonl(orders):
+    """Yield JSON Lines, one per order with its items."""
+    for order, items in iter_orders_with_items(orders):
+        yield json.dumps(
+            {**order, 'items': items},
+            cls=DjangoJSONEncoder,
+            ensure_ascii=False,
+        ) + '\n'
+
+
+def export_orders(orders, export_format):
+    if export_format == 'csv':
+        return iter_csv(orders)
+    if export_format == 'jsonl':
+        return iter_jsonl(orders)
+    raise ValueError(f'Unknown export format: {export_format}')
@@ -0,0 +1,59 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+class IdempotencyKeyReused(Exception):
+    """The key was already used for a request with another body."""
+
+
+def get_request_hash(request):
+    return hashlib.sha256(request.body).hexdigest()
+
+
+def get_expiry_threshold():
+    return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+
+def get_stored_response(key, request_hash):
+    """Return the stored (status, body) of the request with the key, if any.
+
+    Expired keys are deleted, so the key can be used again.
+    """
+    stored = IdempotencyKey.objects.filter(key=key).first()
+    if stored is None:
+        return None
+    if stored.created_at < get_expiry_threshold():
+        stored.delete()
+        return None
+    if stored.request_hash != request_hash:
+        raise IdempotencyKeyReused(key)
+    return stored.response_status, stored.response_body
+
+
+def store_response(key, request_hash, order, response_status, response_body):
+    """Save the response of the request with the key.
+
+    The key is unique, so when concurrent requests carry the same key only
+    the first one to commit succeeds and the others get an IntegrityError.
+    """
+    IdempotencyKey.objects.create(
+        key=key,
+        request_hash=request_hash,
+        order=order,
+        response_status=response_status,
+        response_body=response_body,
+    )
+
+
+def prune_idempotency_keys():
+    deleted_count, _ = IdempotencyKey.objects.filter(
+        created_at__lt=get_expiry_threshold()
+    ).delete()
+    return deleted_count
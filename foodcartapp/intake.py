@@ -0,0 +1,42 @@
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import QueuedOrder
+from .serializers import OrderSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def process_queued_orders(batch_size=100):
+    """Turn a batch of queued orders into real orders.
+
+    The whole batch is written in one transaction, every order in its own
+    savepoint so a broken payload does not stop the others.
+    Return the number of queued orders handled.
+    """
+    with transaction.atomic():
+        queued_orders = list(
+            QueuedOrder.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=QueuedOrder.PENDING)
+            .order_by('id')[:batch_size]
+        )
+        for queued_order in queued_orders:
+            serializer = OrderSerializer(data=queued_order.payload)
+            try:
+                serializer.is_valid(raise_exception=True)
+                queued_order.order = serializer.save()
+                queued_order.status = QueuedOrder.PROCESSED
+            except serializers.ValidationError as error:
+                logger.warning('Queued order %s rejected: %s', queued_order.token, error.detail)
+                queued_order.status = QueuedOrder.FAILED
+                queued_order.error = str(error.detail)
+            queued_order.processed_at = timezone.now()
+
+        QueuedOrder.objects.bulk_update(
+            queued_orders, ['order', 'status', 'error', 'processed_at']
+        )
+    return len(queued_orders)
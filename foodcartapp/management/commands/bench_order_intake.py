@@ -0,0 +1,135 @@
+import asyncio
+import json
+from timeit import default_timer
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+
+from foodcartapp.benchmarking import summarize, temporary_database
+from foodcartapp.intake import process_queued_orders
+from foodcartapp.models import Product, Restaurant, RestaurantMenuItem
+
+
+def create_menu(products_count):
+    restaurant = Restaurant.objects.create(name='Star Burger')
+    Product.objects.bulk_create([
+        Product(name=f'Бургер {number}', price=100 + number, image='burger.jpg')
+        for number in range(products_count)
+    ])
+    products = list(Product.objects.all())
+    RestaurantMenuItem.objects.bulk_create([
+        RestaurantMenuItem(restaurant=restaurant, product=product)
+        for product in products
+    ])
+    return products
+
+
+def build_payload(products):
+    return json.dumps({
+        'products': [
+            {'product': product.id, 'quantity': 1} for product in products
+        ],
+        'firstname': 'Иван',
+        'lastname': 'Петров',
+        'phonenumber': '+79123456789',
+        'address': 'Москва, Красная площадь, 1',
+    })
+
+
+async def post_order(application, url, payload):
+    """Send one order straight to the ASGI application.
+
+    Return (status, milliseconds) of the request.
+    """
+    body = payload.encode('utf-8')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'POST',
+        'scheme': 'http',
+        'path': url,
+        'raw_path': url.encode('ascii'),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [
+            (b'host', b'testserver'),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('ascii')),
+        ],
+        'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    response = {}
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # the client never disconnects
+        return await asyncio.get_running_loop().create_future()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+
+    started_at = default_timer()
+    await application(scope, receive, send)
+    return response['status'], (default_timer() - started_at) * 1000
+
+
+async def run_load(application, url, payload, orders_count, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post_limited():
+        async with semaphore:
+            return await post_order(application, url, payload)
+
+    started_at = default_timer()
+    results = await asyncio.gather(*(post_limited() for _ in range(orders_count)))
+    elapsed = default_timer() - started_at
+    return {
+        **summarize([timing for status, timing in results]),
+        'errors': sum(status >= 400 for status, timing in results),
+        'orders_per_second': round(orders_count / elapsed, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare the synchronous and the queued order intake served over ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200)
+        parser.add_argument('--items', type=int, default=10)
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Requests in flight at once on the ASGI application',
+        )
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            payload = build_payload(create_menu(options['items']))
+            application = get_asgi_application()
+
+            results = {
+                'register_order': asyncio.run(run_load(
+                    application, '/api/order/', payload,
+                    options['orders'], options['concurrency'],
+                )),
+                'enqueue_order': asyncio.run(run_load(
+                    application, '/api/order/async/', payload,
+                    options['orders'], options['concurrency'],
+                )),
+            }
+            started_at = default_timer()
+            while process_queued_orders():
+                pass
+            results['process_order_queue'] = {
+                'orders_per_second': round(
+                    options['orders'] / (default_timer() - started_at), 1
+                ),
+            }
+
+        self.stdout.write(json.dumps(results, indent=4))
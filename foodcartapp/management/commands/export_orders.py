@@ -0,0 +1,29 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from foodcartapp.exports import EXPORT_FORMATS, export_orders, filter_orders
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Stream order history with items as CSV or JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat,
+                            help='First day of the period, YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat,
+                            help='Last day of the period, YYYY-MM-DD')
+        parser.add_argument('--status', nargs='+', choices=[status for status, _ in Order.STATUSES])
+        parser.add_argument('--output', help='File to write, stdout by default')
+
+    def handle(self, *args, **options):
+        orders = filter_orders(options['date_from'], options['date_to'], options['status'])
+        chunks = export_orders(orders, options['format'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            output.writelines(chunks)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodcartapp.synthetic_data import generate_synthetic_data
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with random restaurants, menu and orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=10)
+        parser.add_argument('--products', type=int, default=100)
+        parser.add_argument('--categories', type=int, default=8)
+        parser.add_argument(
+            '--menu-density',
+            type=float,
+            default=0.8,
+            help='Probability of a product being on sale in a restaurant',
+        )
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--max-order-items', type=int, default=5)
+        parser.add_argument('--seed', type=int)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            generate_synthetic_data(
+                restaurants_count=options['restaurants'],
+                products_count=options['products'],
+                categories_count=options['categories'],
+                menu_density=options['menu_density'],
+                orders_count=options['orders'],
+                max_order_items=options['max_order_items'],
+                seed=options['seed'],
+            )
+        self.stdout.write(self.style.SUCCESS('Synthetic data generated'))
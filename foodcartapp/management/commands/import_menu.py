@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodcartapp.menu_import import MenuImportError, read_menu_file, sync_menu
+
+
+class DryRunRollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Sync products, prices and restaurant menus with a CSV or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON file with the menu')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show the changes without saving them',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            rows = read_menu_file(options['path'])
+            with transaction.atomic():
+                report = sync_menu(rows)
+                if options['dry_run']:
+                    raise DryRunRollback
+        except DryRunRollback:
+            pass
+        except (OSError, ValueError, MenuImportError) as error:
+            raise CommandError(error)
+
+        if not report:
+            self.stdout.write('Menu is up to date')
+            return
+        if options['dry_run']:
+            self.stdout.write('Dry run, nothing is saved')
+        for change, names in report.items():
+            self.stdout.write(f'{change}: {len(names)}')
+            for name in names:
+                self.stdout.write(f'  {name}')
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodcartapp.intake import process_queued_orders
+
+
+class Command(BaseCommand):
+    help = 'Create orders accepted by the async intake endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1,
+            help='Seconds to sleep when the queue is empty',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue and exit',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed_count = process_queued_orders(options['batch_size'])
+            if processed_count:
+                self.stdout.write(f'Processed {processed_count} queued orders')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
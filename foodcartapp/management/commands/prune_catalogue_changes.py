@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from foodcartapp.models import CatalogueChange
+
+
+class Command(BaseCommand):
+    help = 'Delete old entries of the catalogue change log'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Keep changes of the last days. Older clients reload the full menu',
+        )
+
+    def handle(self, *args, **options):
+        last_change = CatalogueChange.objects.order_by('-id').first()
+        if last_change is None:
+            return
+        deleted_count, _ = (
+            CatalogueChange.objects
+            .filter(created_at__lt=timezone.now() - timedelta(days=options['days']))
+            .exclude(pk=last_change.pk)
+            .delete()
+        )
+        self.stdout.write(f'Deleted {deleted_count} catalogue changes')
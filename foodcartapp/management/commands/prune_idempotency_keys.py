@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.idempotency import prune_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys of orders older than IDEMPOTENCY_KEY_TTL'
+
+    def handle(self, *args, **options):
+        deleted_count = prune_idempotency_keys()
+        self.stdout.write(f'Deleted {deleted_count} idempotency keys')
@@ -0,0 +1,133 @@
+import json
+import platform
+import subprocess
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from foodcartapp.benchmarking import measure, summarize, temporary_database
+from foodcartapp.models import Product
+from foodcartapp.synthetic_data import generate_synthetic_data
+
+DATA_SIZES = {
+    'small': {'restaurants': 5, 'products': 30, 'orders': 100},
+    'medium': {'restaurants': 20, 'products': 150, 'orders': 2000},
+    'large': {'restaurants': 100, 'products': 500, 'orders': 20000},
+}
+
+
+def get_git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_order_payload():
+    products = Product.objects.available()[:5]
+    return json.dumps({
+        'products': [{'product': product.id, 'quantity': 1} for product in products],
+        'firstname': 'Иван',
+        'lastname': 'Петров',
+        'phonenumber': '+79123456789',
+        'address': 'Москва, Красная площадь, 1',
+    })
+
+
+def get_endpoints(client):
+    order_payload = build_order_payload()
+
+    def get_products_uncached():
+        cache.clear()
+        return client.get('/api/products/')
+
+    return {
+        'product_list_api': lambda: client.get('/api/products/'),
+        'product_list_api_uncached': get_products_uncached,
+        'register_order': lambda: client.post(
+            '/api/order/', order_payload, content_type='application/json'
+        ),
+        'view_orders': lambda: client.get('/manager/orders/'),
+        'view_products': lambda: client.get('/manager/products/'),
+        'view_restaurants': lambda: client.get('/manager/restaurants/'),
+    }
+
+
+def benchmark_endpoint(request, repeat):
+    with CaptureQueriesContext(connection) as queries:
+        response = request()
+    if response.status_code >= 400:
+        raise CommandError(f'Benchmarked request failed with {response.status_code}')
+    return {
+        'queries': len(queries.captured_queries),
+        'response_bytes': len(response.content),
+        **summarize(measure(request, repeat)),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Time the storefront and manager endpoints on synthetic data of several sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            nargs='+',
+            choices=DATA_SIZES,
+            default=['small', 'medium'],
+        )
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--menu-density', type=float, default=0.8)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write JSON results to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        results = []
+        with temporary_database():
+            for size_name in options['sizes']:
+                size = DATA_SIZES[size_name]
+                call_command('flush', interactive=False, verbosity=0)
+                cache.clear()
+                generate_synthetic_data(
+                    restaurants_count=size['restaurants'],
+                    products_count=size['products'],
+                    categories_count=8,
+                    menu_density=options['menu_density'],
+                    orders_count=size['orders'],
+                    max_order_items=5,
+                    seed=options['seed'],
+                )
+                client = Client()
+                client.force_login(
+                    User.objects.create_user('benchmark', is_staff=True)
+                )
+                for endpoint, request in get_endpoints(client).items():
+                    self.stderr.write(f'{size_name}: {endpoint}')
+                    results.append({
+                        'size': size_name,
+                        **size,
+                        'endpoint': endpoint,
+                        **benchmark_endpoint(request, options['repeat']),
+                    })
+
+        report = json.dumps({
+            'created_at': timezone.now().isoformat(),
+            'git_revision': get_git_revision(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'results': results,
+        }, indent=4, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        else:
+            self.stdout.write(report)
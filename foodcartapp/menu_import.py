@@ -0,0 +1,218 @@
+import csv
+import json
+from collections import Counter, defaultdict
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.db import transaction
+
+from .catalogue import bump_catalogue_version
+from .models import Product, ProductCategory, Restaurant, RestaurantMenuItem
+
+CSV_PRODUCT_COLUMNS = ['name', 'category', 'price', 'description', 'special_status']
+TRUE_VALUES = {'1', 'true', 'yes', 'да', '+'}
+PRODUCT_FIELDS = ['category', 'price', 'description', 'special_status']
+
+
+class MenuImportError(Exception):
+    pass
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def get_text(row, field):
+    value = row.get(field)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise MenuImportError(f'Field {field} of product {row.get("name")!r} must be a string')
+    return value
+
+
+def parse_menu_row(row, restaurants):
+    """Normalize a product row read from a file.
+
+    `restaurants` maps a restaurant name to its availability value, an empty
+    value means the product is not on the restaurant menu at all.
+    """
+    if not isinstance(row, dict):
+        raise MenuImportError(f'Product must be an object, got {row!r}')
+    name = get_text(row, 'name').strip()
+    if not name:
+        raise MenuImportError('Product without name')
+    try:
+        price = Decimal(str(row['price']))
+    except (KeyError, InvalidOperation):
+        raise MenuImportError(f'Wrong price of product {name!r}')
+    if not price.is_finite() or price < 0:
+        raise MenuImportError(f'Wrong price of product {name!r}')
+    if not isinstance(restaurants, dict):
+        raise MenuImportError(f'Restaurants of product {name!r} must be an object')
+    return {
+        'name': name,
+        'category': get_text(row, 'category').strip() or None,
+        'price': price,
+        'description': get_text(row, 'description'),
+        'special_status': parse_bool(row.get('special_status', False)),
+        'restaurants': {
+            restaurant_name: parse_bool(available)
+            for restaurant_name, available in restaurants.items()
+            if available not in (None, '')
+        },
+    }
+
+
+def read_menu_file(path):
+    """Read products from a CSV or a JSON file.
+
+    CSV has columns name, category, price, description, special_status
+    and one more column per restaurant with 1/0 availability.
+    JSON is a list of objects with the same keys and a `restaurants` object
+    mapping restaurant names to availability.
+    """
+    path = Path(path)
+    if path.suffix == '.json':
+        with path.open(encoding='utf-8') as file:
+            rows = json.load(file)
+        if not isinstance(rows, list):
+            raise MenuImportError('JSON menu must be a list of products')
+        return [
+            parse_menu_row(row, row.get('restaurants', {}) if isinstance(row, dict) else {})
+            for row in rows
+        ]
+
+    with path.open(encoding='utf-8', newline='') as file:
+        return [
+            parse_menu_row(row, {
+                column: value for column, value in row.items()
+                if column not in CSV_PRODUCT_COLUMNS
+            })
+            for row in csv.DictReader(file)
+        ]
+
+
+def sync_menu(rows):
+    """Apply menu rows to the database, touching only what differs.
+
+    Current products and menu items are loaded once, compared with the rows
+    in memory and changed with a few bulk queries in one transaction.
+    Return a report dict with lists of created and updated objects.
+    """
+    duplicates = sorted(
+        name for name, count in Counter(row['name'] for row in rows).items()
+        if count > 1
+    )
+    if duplicates:
+        raise MenuImportError(f'Duplicate products: {", ".join(duplicates)}')
+
+    report = defaultdict(list)
+    with transaction.atomic():
+        restaurants = {
+            restaurant.name: restaurant
+            for restaurant in Restaurant.objects.all()
+        }
+        unknown_restaurants = {
+            restaurant_name
+            for row in rows
+            for restaurant_name in row['restaurants']
+            if restaurant_name not in restaurants
+        }
+        if unknown_restaurants:
+            raise MenuImportError(f'Unknown restaurants: {", ".join(sorted(unknown_restaurants))}')
+
+        categories = sync_categories(rows, report)
+        products = sync_products(rows, categories, report)
+        sync_menu_items(rows, restaurants, products, report)
+
+        if report:
+            bump_catalogue_version()
+    return report
+
+
+def sync_categories(rows, report):
+    categories = {category.name: category for category in ProductCategory.objects.all()}
+    new_categories = {
+        row['category'] for row in rows
+        if row['category'] and row['category'] not in categories
+    }
+    if new_categories:
+        ProductCategory.objects.bulk_create([
+            ProductCategory(name=name) for name in sorted(new_categories)
+        ])
+        report['created categories'] = sorted(new_categories)
+        categories = {category.name: category for category in ProductCategory.objects.all()}
+    return categories
+
+
+def sync_products(rows, categories, report):
+    products = {}
+    for product in Product.objects.select_related('category').order_by('-id'):
+        products[product.name] = product
+
+    new_products = []
+    changed_products = []
+    changed_fields = set()
+    for row in rows:
+        values = {
+            'category': categories.get(row['category']),
+            'price': row['price'],
+            'description': row['description'],
+            'special_status': row['special_status'],
+        }
+        product = products.get(row['name'])
+        if product is None:
+            new_products.append(Product(name=row['name'], **values))
+            continue
+        product_changes = [
+            field for field in PRODUCT_FIELDS
+            if getattr(product, field) != values[field]
+        ]
+        if product_changes:
+            for field in product_changes:
+                setattr(product, field, values[field])
+            changed_fields.update(product_changes)
+            changed_products.append(product)
+
+    if new_products:
+        Product.objects.bulk_create(new_products)
+        report['created products'] = [product.name for product in new_products]
+        new_names = {product.name for product in new_products}
+        for product in Product.objects.filter(name__in=new_names):
+            products[product.name] = product
+    if changed_products:
+        Product.objects.bulk_update(changed_products, sorted(changed_fields))
+        report['updated products'] = [product.name for product in changed_products]
+    return products
+
+
+def sync_menu_items(rows, restaurants, products, report):
+    menu_items = {
+        (item.restaurant_id, item.product_id): item
+        for item in RestaurantMenuItem.objects.all()
+    }
+    new_items = []
+    changed_items = []
+    for row in rows:
+        product = products[row['name']]
+        for restaurant_name, available in row['restaurants'].items():
+            restaurant = restaurants[restaurant_name]
+            item = menu_items.get((restaurant.id, product.id))
+            if item is None:
+                new_items.append(RestaurantMenuItem(
+                    restaurant=restaurant, product=product, availability=available
+                ))
+            elif item.availability != available:
+                item.availability = available
+                changed_items.append(item)
+            else:
+                continue
+            report['changed menu items'].append(
+                f'{restaurant_name} - {row["name"]}: {"в продаже" if available else "нет в продаже"}'
+            )
+
+    RestaurantMenuItem.objects.bulk_create(new_items, batch_size=1000)
+    RestaurantMenuItem.objects.bulk_update(changed_items, ['availability'], batch_size=1000)
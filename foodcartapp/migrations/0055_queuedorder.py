@@ -0,0 +1,32 @@
+# Generated by Django 3.2.15 on 2026-10-18 19:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0054_order_queue_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedOrder',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='токен')),
+                ('payload', models.JSONField(verbose_name='данные заказа')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('processed', 'Обработан'), ('failed', 'Ошибка')], db_index=True, default='pending', max_length=20, verbose_name='статус')),
+                ('error', models.TextField(blank=True, verbose_name='ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='поступил')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='обработан')),
+                ('order', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='queued_order', to='foodcartapp.order', verbose_name='заказ')),
+            ],
+            options={
+                'verbose_name': 'заказ в очереди',
+                'verbose_name_plural': 'заказы в очереди',
+            },
+        ),
+    ]
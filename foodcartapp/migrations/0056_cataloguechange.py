@@ -0,0 +1,26 @@
+# Generated by Django 3.2.15 on 2026-10-18 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0055_queuedorder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='id товара')),
+                ('kind', models.CharField(choices=[('changed', 'Изменён'), ('removed', 'Удалён'), ('reset', 'Меню изменено целиком')], max_length=20, verbose_name='тип изменения')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='дата изменения')),
+            ],
+            options={
+                'verbose_name': 'изменение меню',
+                'verbose_name_plural': 'изменения меню',
+            },
+        ),
+    ]
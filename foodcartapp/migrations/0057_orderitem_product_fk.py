@@ -0,0 +1,24 @@
+# Generated by Django 3.2.15 on 2026-10-18 19:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0056_cataloguechange'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='orderitem',
+            old_name='product',
+            new_name='product_name',
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_items', to='foodcartapp.product', verbose_name='продукт'),
+        ),
+    ]
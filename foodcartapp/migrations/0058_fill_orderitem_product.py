@@ -0,0 +1,47 @@
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+
+
+def fill_order_item_products(apps, schema_editor):
+    """Link order items to products by the stored product name.
+
+    Items are updated in batches of ids, each batch in its own transaction,
+    so a large table is not locked at once. Items whose product was renamed
+    or deleted keep an empty product and their name snapshot.
+    """
+    Product = apps.get_model('foodcartapp', 'Product')
+    OrderItem = apps.get_model('foodcartapp', 'OrderItem')
+    product_ids = {}
+    for product_id, name in Product.objects.order_by('-id').values_list('id', 'name'):
+        product_ids[name] = product_id
+
+    last_id = 0
+    while True:
+        items = list(
+            OrderItem.objects
+            .filter(id__gt=last_id, product__isnull=True)
+            .order_by('id')
+            .only('id', 'product_name')[:BATCH_SIZE]
+        )
+        if not items:
+            break
+        last_id = items[-1].id
+        for item in items:
+            item.product_id = product_ids.get(item.product_name)
+        with transaction.atomic():
+            OrderItem.objects.bulk_update(
+                [item for item in items if item.product_id], ['product']
+            )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('foodcartapp', '0057_orderitem_product_fk'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_order_item_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.15 on 2026-10-18 19:16
+
+from django.db import migrations
+import phonenumber_field.modelfields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0058_fill_orderitem_product'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='phonenumber',
+            field=phonenumber_field.modelfields.PhoneNumberField(db_index=True, max_length=128, region=None, verbose_name='номер телефона'),
+        ),
+    ]
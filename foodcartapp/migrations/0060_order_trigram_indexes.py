@@ -0,0 +1,42 @@
+from django.db import migrations
+
+TRIGRAM_INDEXES = {
+    'order_firstname_trgm_idx': 'firstname',
+    'order_lastname_trgm_idx': 'lastname',
+    'order_address_trgm_idx': 'address',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Index the searched order columns for LIKE on Postgres.
+
+    The admin search runs UPPER(column::text) LIKE '%term%', so the
+    trigram indexes are built on the same expression. Other databases
+    are skipped.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for index_name, column in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {index_name} ON foodcartapp_order '
+            f'USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index_name in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index_name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0059_order_phonenumber_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
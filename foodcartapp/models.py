@@ -1,8 +1,13 @@
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
 from decimal import Decimal
 
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import F, Sum
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from phonenumber_field.modelfields import PhoneNumberField
 
 
@@ -21,6 +26,7 @@ class Restaurant(models.Model):
         max_length=50,
         blank=True,
     )
+    updated_at = models.DateTimeField('дата изменения', auto_now=True)
 
     class Meta:
         verbose_name = 'ресторан'
@@ -127,6 +133,67 @@ class RestaurantMenuItem(models.Model):
         return f"{self.restaurant.name} - {self.product.name}"
 
 
+# ids of the orders being deleted, their items do not maintain the totals
+deleted_order_ids = ContextVar('deleted_order_ids', default=frozenset())
+
+
+@contextmanager
+def collect_deleted_orders():
+    """Let Order pre_delete record the orders deleted in the block."""
+    token = deleted_order_ids.set(set())
+    try:
+        yield
+    finally:
+        deleted_order_ids.reset(token)
+
+
+class OrderQuerySet(models.QuerySet):
+    def delete(self):
+        with collect_deleted_orders():
+            return super().delete()
+
+    def update_total_prices(self):
+        """Recompute fixed_total_price of all orders with a single UPDATE.
+
+        Use it after bulk operations on order items, which bypass
+        OrderItem.save() and so do not maintain the totals.
+        """
+        totals = (
+            OrderItem.objects
+            .filter(order=OuterRef('pk'))
+            .values('order')
+            .annotate(total=Sum(F('fixed_price') * F('quantity')))
+            .values('total')
+        )
+        return self.update(fixed_total_price=Coalesce(
+            Subquery(totals, output_field=models.DecimalField(max_digits=10, decimal_places=2)),
+            Decimal('0.00'),
+        ))
+
+
+class CatalogueChange(models.Model):
+    CHANGED = 'changed'
+    REMOVED = 'removed'
+    RESET = 'reset'
+
+    KINDS = [
+        (CHANGED, 'Изменён'),
+        (REMOVED, 'Удалён'),
+        (RESET, 'Меню изменено целиком'),
+    ]
+
+    product_id = models.PositiveIntegerField('id товара', null=True, blank=True)
+    kind = models.CharField('тип изменения', max_length=20, choices=KINDS)
+    created_at = models.DateTimeField('дата изменения', auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'изменение меню'
+        verbose_name_plural = 'изменения меню'
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.product_id}"
+
+
 class Order(models.Model):
     ACCEPTED = 'accepted'
     IN_PROCESS = 'in_process'
@@ -139,6 +206,7 @@ class Order(models.Model):
         (IN_DELIVERY, 'В пути'),
         (RECEIVED, 'Получен'),
     ]
+    UNPROCESSED_STATUSES = [ACCEPTED, IN_PROCESS, IN_DELIVERY]
 
     ELECTRONIC = 'electronic'
     CASH = 'cash'
@@ -150,7 +218,7 @@ class Order(models.Model):
 
     firstname = models.CharField('имя', max_length=100)
     lastname = models.CharField('фамилия', max_length=100)
-    phonenumber = PhoneNumberField('номер телефона')
+    phonenumber = PhoneNumberField('номер телефона', db_index=True)
     address = models.CharField('адрес', max_length=255)
     fixed_total_price = models.DecimalField(
         'зафиксированная стоимость',
@@ -172,37 +240,43 @@ class Order(models.Model):
     restaurant = models.ForeignKey(Restaurant, on_delete=models.SET_NULL,
                                    null=True, blank=True, related_name='orders', verbose_name='Ресторан')
 
-    _price_updated = False
+    objects = OrderQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'заказ'
         verbose_name_plural = 'заказы'
+        indexes = [
+            models.Index(
+                fields=['status', 'created_at', 'id'],
+                name='order_queue_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Order {self.firstname} {self.lastname}: {self.status}"
 
+    def delete(self, *args, **kwargs):
+        with collect_deleted_orders():
+            return super().delete(*args, **kwargs)
+
     def calculate_total_price(self):
         return self.items.aggregate(
             total=Sum(F('fixed_price') * F('quantity'))
         )['total'] or Decimal('0.00')
 
-    def update_total_price(self):
-        self.fixed_total_price = self.calculate_total_price()
-        self._price_updated = True
-        self.save(update_fields=['fixed_total_price'])
-
-    def save(self, *args, **kwargs):
-        if not self._price_updated:
-            super().save(*args, **kwargs)
-            self.update_total_price()
-        else:
-            super().save(*args, **kwargs)
-
 
 class OrderItem(models.Model):
     order = models.ForeignKey(
         Order, related_name='items', on_delete=models.CASCADE, verbose_name="заказ")
-    product = models.CharField('название продукта', max_length=100)
+    product = models.ForeignKey(
+        Product,
+        related_name='order_items',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='продукт',
+    )
+    product_name = models.CharField('название продукта', max_length=100)
     quantity = models.PositiveIntegerField('количество')
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[
                                 MinValueValidator(Decimal('0.00'))])
@@ -214,10 +288,105 @@ class OrderItem(models.Model):
         verbose_name_plural = 'позиции заказов'
 
     def __str__(self):
-        return f"{self.product} x {self.quantity}"
+        return f"{self.product_name} x {self.quantity}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_line_price()
+        if 'product_id' in instance.__dict__:
+            instance._saved_product_id = instance.product_id
+        return instance
+
+    def get_line_price(self):
+        return self.fixed_price * self.quantity
+
+    def remember_line_price(self):
+        if {'order_id', 'fixed_price', 'quantity'} <= self.__dict__.keys():
+            self._saved_line = (self.order_id, self.get_line_price())
+        else:
+            self._saved_line = None
 
     def save(self, *args, **kwargs):
         if not self.fixed_price or self.fixed_price == Decimal('0.00'):
             self.fixed_price = self.price
+        product_changed = self.product_id != getattr(self, '_saved_product_id', self.product_id)
+        if self.product_id and (product_changed or not self.product_name):
+            self.product_name = self.product.name
+        saved_line = (None, Decimal('0.00')) if self._state.adding else getattr(self, '_saved_line', None)
         super().save(*args, **kwargs)
-        self.order.update_total_price()
+        self._saved_product_id = self.product_id
+        self.apply_line_change(saved_line, self.get_line_price())
+
+    def apply_line_change(self, saved_line, line_price):
+        """Shift the order total by the change of this line price.
+
+        Only the delta is applied, with an atomic UPDATE, so saving an item
+        costs one query whatever the size of the order.
+        """
+        if saved_line is None:
+            Order.objects.filter(pk=self.order_id).update_total_prices()
+            self.remember_line_price()
+            return
+
+        saved_order_id, saved_line_price = saved_line
+        if saved_order_id is not None and saved_order_id != self.order_id:
+            self.shift_order_total(saved_order_id, -saved_line_price)
+            saved_line_price = Decimal('0.00')
+        self.shift_order_total(self.order_id, line_price - saved_line_price)
+        self._saved_line = (self.order_id, line_price)
+
+    def shift_order_total(self, order_id, delta):
+        if not delta:
+            return
+        Order.objects.filter(pk=order_id).update(
+            fixed_total_price=F('fixed_total_price') + delta
+        )
+        cached_order = self._state.fields_cache.get('order')
+        if cached_order is not None and cached_order.pk == order_id:
+            cached_order.fixed_total_price += delta
+
+
+class QueuedOrder(models.Model):
+    PENDING = 'pending'
+    PROCESSED = 'processed'
+    FAILED = 'failed'
+
+    STATUSES = [
+        (PENDING, 'Ожидает'),
+        (PROCESSED, 'Обработан'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    token = models.UUIDField('токен', default=uuid.uuid4, unique=True, editable=False)
+    payload = models.JSONField('данные заказа')
+    status = models.CharField('статус', max_length=20, choices=STATUSES, default=PENDING, db_index=True)
+    order = models.OneToOneField(Order, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='queued_order', verbose_name='заказ')
+    error = models.TextField('ошибка', blank=True)
+    created_at = models.DateTimeField('поступил', auto_now_add=True)
+    processed_at = models.DateTimeField('обработан', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'заказ в очереди'
+        verbose_name_plural = 'заказы в очереди'
+
+    def __str__(self):
+        return f"Queued order {self.token}: {self.status}"
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField('ключ', max_length=255, unique=True)
+    request_hash = models.CharField('хеш запроса', max_length=64)
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True,
+                              related_name='idempotency_keys', verbose_name='заказ')
+    response_status = models.PositiveSmallIntegerField('код ответа')
+    response_body = models.JSONField('тело ответа', encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField('создан', auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'ключ идемпотентности'
+        verbose_name_plural = 'ключи идемпотентности'
+
+    def __str__(self):
+        return self.key
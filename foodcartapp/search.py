@@ -0,0 +1,161 @@
+import heapq
+import re
+from bisect import bisect_left
+from collections import Counter
+from threading import Lock
+
+from .catalogue import build_menu, get_catalogue_changes, get_catalogue_version
+
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile('[а-я]')
+RUSSIAN_ENDINGS = sorted([
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'иях', 'ией',
+    'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ов', 'ев',
+    'ам', 'ям', 'ах', 'ях', 'ом', 'ем', 'ую', 'юю', 'ию', 'ия', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+], key=len, reverse=True)
+MIN_STEM_LENGTH = 3
+
+
+def stem(word):
+    """Cut a Russian inflection ending off the word.
+
+    This is a crude stemmer, but both the index and the queries go through
+    it and the query terms are matched as prefixes, so word forms still
+    find each other.
+    """
+    if not CYRILLIC_RE.search(word):
+        return word
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    text = (text or '').casefold().replace('ё', 'е')
+    return [stem(word) for word in WORD_RE.findall(text)]
+
+
+class PrefixIndex:
+    """Inverted index from terms to product ids with prefix lookups."""
+
+    def __init__(self):
+        self.postings = {}
+        self.terms = []
+        self.terms_outdated = False
+
+    def add(self, product_id, terms):
+        for term in terms:
+            if term not in self.postings:
+                self.postings[term] = set()
+                self.terms_outdated = True
+            self.postings[term].add(product_id)
+
+    def remove(self, product_id, terms):
+        for term in terms:
+            self.postings[term].discard(product_id)
+            if not self.postings[term]:
+                del self.postings[term]
+                self.terms_outdated = True
+
+    def match(self, term):
+        """Return ids of products having a term which starts with the given one."""
+        if self.terms_outdated:
+            self.terms = sorted(self.postings)
+            self.terms_outdated = False
+        product_ids = set()
+        position = bisect_left(self.terms, term)
+        while position < len(self.terms) and self.terms[position].startswith(term):
+            product_ids |= self.postings[self.terms[position]]
+            position += 1
+        return product_ids
+
+
+class ProductSearchIndex:
+    """Process-wide inverted index over the available products.
+
+    Names, descriptions and category names are split into stemmed terms.
+    The index follows the catalogue version: on the first search after a
+    change only the changed products are reindexed from the change log,
+    and the whole index is rebuilt only when the log can not tell what
+    changed.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+        self.clear()
+
+    def clear(self):
+        self.products = {}
+        self.product_terms = {}
+        self.terms_index = PrefixIndex()
+        self.name_index = PrefixIndex()
+
+    def add(self, product):
+        self.remove(product['id'])
+        category = product['category'] or {}
+        name_terms = set(tokenize(product['name']))
+        terms = (
+            name_terms
+            | set(tokenize(product['description']))
+            | set(tokenize(category.get('name')))
+        )
+        self.products[product['id']] = product
+        self.product_terms[product['id']] = (terms, name_terms)
+        self.terms_index.add(product['id'], terms)
+        self.name_index.add(product['id'], name_terms)
+
+    def remove(self, product_id):
+        if product_id not in self.products:
+            return
+        del self.products[product_id]
+        terms, name_terms = self.product_terms.pop(product_id)
+        self.terms_index.remove(product_id, terms)
+        self.name_index.remove(product_id, name_terms)
+
+    def rebuild(self):
+        self.clear()
+        for product in build_menu():
+            self.add(product)
+
+    def refresh(self):
+        token, modified_at = get_catalogue_version()
+        if token == self.version:
+            return
+        changes = None
+        if self.version is not None:
+            changes = get_catalogue_changes(int(self.version))
+        if changes is None:
+            self.rebuild()
+        else:
+            changed_products, removed_product_ids = changes
+            for product_id in removed_product_ids:
+                self.remove(product_id)
+            for product in changed_products:
+                self.add(product)
+        self.version = token
+
+    def search(self, query, limit=20):
+        """Return products matching every word of the query.
+
+        Products matching more words by name go first.
+        """
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return []
+        with self.lock:
+            self.refresh()
+            product_ids = set.intersection(*(
+                self.terms_index.match(term) for term in query_terms
+            ))
+            name_matches = Counter()
+            for term in query_terms:
+                name_matches.update(self.name_index.match(term) & product_ids)
+            best_ids = heapq.nsmallest(limit, product_ids, key=lambda product_id: (
+                -name_matches[product_id], self.products[product_id]['name'],
+            ))
+            return [self.products[product_id] for product_id in best_ids]
+
+
+product_search_index = ProductSearchIndex()
@@ -1,10 +1,14 @@
 from django.db import transaction
 from rest_framework import serializers
 
+from .availability import product_table
 from .models import Order, OrderItem, Product
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
+    # plain id, products are checked against the product table
+    product = serializers.IntegerField()
+
     class Meta:
         model = OrderItem
         fields = ['product', 'quantity']
@@ -37,9 +41,20 @@ class OrderSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "Duplicate products are not allowed")
 
-        if not Product.objects.filter(id__in=product_ids).exists():
-            raise serializers.ValidationError(
-                "One or more products do not exist")
+        # the cached table only rejects bad orders early, prices are read
+        # from the database when the order is created
+        products = product_table.get()
+        errors = []
+        for product_id in product_ids:
+            product = products.get(product_id)
+            if product is None:
+                errors.append({'product': [f'Product {product_id} does not exist']})
+            elif not product['available']:
+                errors.append({'product': [f'Product {product_id} is not available']})
+            else:
+                errors.append({})
+        if any(errors):
+            raise serializers.ValidationError(errors)
 
         return value
 
@@ -48,15 +63,42 @@ class OrderSerializer(serializers.ModelSerializer):
 
         try:
             with transaction.atomic():
-                order = Order.objects.create(**validated_data)
+                products = (
+                    Product.objects
+                    .available()
+                    .only('id', 'name', 'price')
+                    .in_bulk([product_data['product'] for product_data in products_data])
+                )
+                missing_products = [
+                    product_data['product'] for product_data in products_data
+                    if product_data['product'] not in products
+                ]
+                if missing_products:
+                    raise serializers.ValidationError({'products': [
+                        {'product': [f'Product {product_data["product"]} is not available']}
+                        if product_data['product'] in missing_products else {}
+                        for product_data in products_data
+                    ]})
+
+                order = Order(**validated_data)
+                order_items = []
                 for product_data in products_data:
-                    product = Product.objects.get(pk=product_data['product'])
-                    OrderItem.objects.create(
+                    product = products[product_data['product']]
+                    order_items.append(OrderItem(
                         order=order,
                         product=product,
+                        product_name=product.name,
                         quantity=product_data['quantity'],
-                        price=product.price
-                    )
+                        price=product.price,
+                        fixed_price=product.price,
+                    ))
+                order.fixed_total_price = sum(
+                    item.fixed_price * item.quantity for item in order_items
+                )
+                order.save()
+                OrderItem.objects.bulk_create(order_items)
                 return order
+        except serializers.ValidationError:
+            raise
         except Exception as e:
             raise serializers.ValidationError(f"Order creation failed: {e}")
@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .catalogue import bump_catalogue_version
+from .models import (CatalogueChange, Order, OrderItem, Product,
+                     ProductCategory, RestaurantMenuItem, deleted_order_ids)
+from .thumbnails import get_renditions
+
+
+@receiver(post_save, sender=Product)
+def log_product_change(sender, instance, **kwargs):
+    bump_catalogue_version([instance.id])
+
+
+@receiver(post_delete, sender=Product)
+def log_product_removal(sender, instance, **kwargs):
+    bump_catalogue_version([instance.id], CatalogueChange.REMOVED)
+
+
+@receiver(post_save, sender=ProductCategory)
+def log_category_change(sender, instance, **kwargs):
+    bump_catalogue_version(instance.products.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=ProductCategory)
+def log_category_removal(sender, instance, **kwargs):
+    bump_catalogue_version()
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def log_menu_item_change(sender, instance, **kwargs):
+    bump_catalogue_version([instance.product_id])
+
+
+@receiver(pre_delete, sender=Order)
+def collect_deleted_order(sender, instance, **kwargs):
+    order_ids = deleted_order_ids.get()
+    if isinstance(order_ids, set):
+        order_ids.add(instance.pk)
+
+
+@receiver(post_delete, sender=OrderItem)
+def subtract_order_item_price(sender, instance, **kwargs):
+    # the order goes away with its items, its total does not matter
+    if instance.order_id in deleted_order_ids.get():
+        return
+    instance.apply_line_change(
+        getattr(instance, '_saved_line', None), Decimal('0.00')
+    )
+
+
+@receiver(post_save, sender=Product)
+def make_product_thumbnails(sender, instance, **kwargs):
+    get_renditions(instance.image)
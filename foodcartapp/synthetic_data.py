@@ -0,0 +1,106 @@
+import random
+from decimal import Decimal
+
+from django.db import transaction
+from places.spatial import invalidate_restaurant_index_version
+
+from .catalogue import bump_catalogue_version
+from .models import (Order, OrderItem, Product, ProductCategory, Restaurant,
+                     RestaurantMenuItem)
+
+FIRSTNAMES = ['Иван', 'Мария', 'Пётр', 'Анна', 'Сергей', 'Ольга']
+LASTNAMES = ['Иванов', 'Петрова', 'Сидоров', 'Смирнова', 'Кузнецов']
+STREETS = ['Тверская', 'Арбат', 'Покровка', 'Маросейка', 'Никольская']
+
+
+def generate_address():
+    return f'Москва, {random.choice(STREETS)}, {random.randint(1, 150)}'
+
+
+def generate_synthetic_data(restaurants_count, products_count, categories_count,
+                            menu_density, orders_count, max_order_items, seed=None):
+    """Fill the database with random restaurants, menu and order history.
+
+    menu_density is the probability of a product being on sale in
+    a restaurant. Rows are inserted in bulk, so the caches fed by model
+    signals are reset once at the end.
+    """
+    random.seed(seed)
+
+    Restaurant.objects.bulk_create([
+        Restaurant(
+            name=f'Star Burger {number}',
+            address=generate_address(),
+            contact_phone=f'+7495{number:07d}',
+        )
+        for number in range(restaurants_count)
+    ])
+    ProductCategory.objects.bulk_create([
+        ProductCategory(name=f'Категория {number}')
+        for number in range(categories_count)
+    ])
+    categories = list(ProductCategory.objects.all())
+    Product.objects.bulk_create([
+        Product(
+            name=f'Блюдо {number}',
+            category=random.choice(categories) if categories else None,
+            price=Decimal(random.randint(50, 900)),
+            image='synthetic.jpg',
+            special_status=random.random() < 0.1,
+            description='Синтетический товар для нагрузочных тестов',
+        )
+        for number in range(products_count)
+    ])
+
+    restaurant_ids = list(Restaurant.objects.values_list('id', flat=True))
+    products = list(Product.objects.only('id', 'name', 'price'))
+    RestaurantMenuItem.objects.bulk_create([
+        RestaurantMenuItem(
+            restaurant_id=restaurant_id,
+            product=product,
+            availability=random.random() < menu_density,
+        )
+        for restaurant_id in restaurant_ids
+        for product in products
+    ], batch_size=1000)
+
+    last_order_id = Order.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    orders_items = []
+    orders = []
+    for _ in range(orders_count):
+        order_products = random.sample(products, min(len(products), random.randint(1, max_order_items)))
+        order_items = [
+            OrderItem(
+                product=product,
+                product_name=product.name,
+                quantity=random.randint(1, 3),
+                price=product.price,
+                fixed_price=product.price,
+            )
+            for product in order_products
+        ]
+        orders_items.append(order_items)
+        orders.append(Order(
+            firstname=random.choice(FIRSTNAMES),
+            lastname=random.choice(LASTNAMES),
+            phonenumber=f'+7912{random.randint(0, 9999999):07d}',
+            address=generate_address(),
+            status=random.choice(Order.STATUSES)[0],
+            payment_method=random.choice(Order.PAYMENT_METHODS)[0],
+            restaurant_id=random.choice(restaurant_ids) if restaurant_ids and random.random() < 0.5 else None,
+            fixed_total_price=sum(item.fixed_price * item.quantity for item in order_items),
+        ))
+    Order.objects.bulk_create(orders, batch_size=1000)
+
+    # bulk_create does not return primary keys on every database backend
+    order_ids = Order.objects.filter(id__gt=last_order_id).order_by('id').values_list('id', flat=True)
+    for order_id, order_items in zip(order_ids, orders_items):
+        for item in order_items:
+            item.order_id = order_id
+    OrderItem.objects.bulk_create(
+        [item for order_items in orders_items for item in order_items],
+        batch_size=1000,
+    )
+
+    bump_catalogue_version()
+    transaction.on_commit(invalidate_restaurant_index_version)
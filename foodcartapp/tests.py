@@ -0,0 +1,916 @@
+import asyncio
+import csv
+import hashlib
+import json
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from star_burger.db import ReplicaRouter, use_replica
+from star_burger.metrics import registry
+from star_burger.middleware import (ConnectionHealthCheckMiddleware,
+                                    InstrumentationMiddleware)
+
+from .availability import CatalogueIndex
+from .catalogue import bump_catalogue_version
+from .exports import (ORDER_FIELDS, ORDER_ITEM_FIELDS, export_orders,
+                      filter_orders, iter_orders_with_items)
+from .intake import process_queued_orders
+from .models import (CatalogueChange, Order, OrderItem, Product,
+                     ProductCategory, QueuedOrder, Restaurant,
+                     RestaurantMenuItem)
+from .search import ProductSearchIndex
+from .serializers import OrderSerializer
+from .thumbnails import (RENDITION_SIZES, generate_renditions,
+                         get_available_formats, get_renditions)
+
+
+class OrderSerializerCreateTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        restaurant = Restaurant.objects.create(name='Star Burger')
+        cls.products = [
+            Product.objects.create(name=f'Бургер {number}', price=100 + number, image='burger.jpg')
+            for number in range(10)
+        ]
+        RestaurantMenuItem.objects.bulk_create([
+            RestaurantMenuItem(restaurant=restaurant, product=product)
+            for product in cls.products
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def build_serializer(self, products, is_valid=True):
+        serializer = OrderSerializer(data={
+            'products': [
+                {'product': product_id, 'quantity': 2} for product_id in products
+            ],
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79123456789',
+            'address': 'Москва, Красная площадь, 1',
+        })
+        self.assertEqual(serializer.is_valid(), is_valid, serializer.errors)
+        return serializer
+
+    def count_create_queries(self, products):
+        serializer = self.build_serializer([product.id for product in products])
+        with CaptureQueriesContext(connection) as context:
+            order = serializer.save()
+        return order, len(context.captured_queries)
+
+    def test_creates_items_and_total(self):
+        order, _ = self.count_create_queries(self.products[:3])
+
+        order = Order.objects.get(pk=order.pk)
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(order.fixed_total_price, Decimal('606.00'))
+
+    def test_query_count_does_not_depend_on_items_count(self):
+        _, single_item_queries = self.count_create_queries(self.products[:1])
+        _, many_items_queries = self.count_create_queries(self.products)
+
+        self.assertEqual(single_item_queries, many_items_queries)
+
+    def test_query_count(self):
+        serializer = self.build_serializer([product.id for product in self.products])
+        # savepoint, products prices, order insert, items insert, release
+        with self.assertNumQueries(5):
+            serializer.save()
+
+    def test_validation_reports_every_bad_product(self):
+        unavailable_product = Product.objects.create(name='Салат', price=50)
+        serializer = self.build_serializer(
+            [self.products[0].id, 0, unavailable_product.id], is_valid=False
+        )
+
+        item_errors = serializer.errors['products']
+        self.assertEqual(item_errors[0], {})
+        self.assertIn('does not exist', str(item_errors[1]['product'][0]))
+        self.assertIn('is not available', str(item_errors[2]['product'][0]))
+
+    def test_creation_uses_current_prices(self):
+        serializer = self.build_serializer([product.id for product in self.products[:2]])
+        # the product table still holds the old price and product
+        Product.objects.filter(pk=self.products[0].pk).update(price=500)
+        Product.objects.filter(pk=self.products[1].pk).delete()
+
+        with self.assertRaises(ValidationError) as context:
+            serializer.save()
+        item_errors = context.exception.detail['products']
+        self.assertEqual(item_errors[0], {})
+        self.assertIn('is not available', str(item_errors[1]['product'][0]))
+
+        serializer = self.build_serializer([self.products[0].id])
+        order = serializer.save()
+        self.assertEqual(order.fixed_total_price, Decimal('1000.00'))
+
+
+class OrderTotalPriceTest(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79123456789',
+            address='Москва, Красная площадь, 1',
+        )
+
+    def create_item(self, price, quantity):
+        return OrderItem.objects.create(
+            order=self.order, product_name='Бургер', quantity=quantity, price=price
+        )
+
+    def get_total_price(self):
+        return Order.objects.get(pk=self.order.pk).fixed_total_price
+
+    def test_item_changes_update_total(self):
+        first_item = self.create_item(100, 2)
+        second_item = self.create_item(50, 1)
+        self.assertEqual(self.get_total_price(), Decimal('250.00'))
+
+        first_item = OrderItem.objects.get(pk=first_item.pk)
+        first_item.quantity = 3
+        first_item.save()
+        self.assertEqual(self.get_total_price(), Decimal('350.00'))
+
+        OrderItem.objects.filter(pk=second_item.pk).delete()
+        self.assertEqual(self.get_total_price(), Decimal('300.00'))
+
+    def test_item_save_costs_one_update(self):
+        for _ in range(5):
+            self.create_item(100, 1)
+        item = OrderItem.objects.first()
+        item.quantity = 2
+
+        # item update and order total update
+        with self.assertNumQueries(2):
+            item.save()
+
+    def test_order_deletion_does_not_update_total(self):
+        other_order = Order.objects.create(
+            firstname='Пётр',
+            lastname='Иванов',
+            phonenumber='+79123456780',
+            address='Москва, Тверская, 1',
+        )
+        for _ in range(5):
+            self.create_item(100, 1)
+            OrderItem.objects.create(order=other_order, product_name='Бургер', quantity=1, price=100)
+
+        for delete in [self.order.delete, Order.objects.filter(pk=other_order.pk).delete]:
+            with self.subTest(delete=delete), CaptureQueriesContext(connection) as context:
+                delete()
+
+            self.assertFalse([
+                query for query in context.captured_queries
+                if query['sql'].startswith('UPDATE')
+            ])
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_update_total_prices_after_bulk_changes(self):
+        self.create_item(100, 1)
+        OrderItem.objects.filter(order=self.order).update(quantity=4)
+
+        Order.objects.filter(pk=self.order.pk).update_total_prices()
+
+        self.assertEqual(self.get_total_price(), Decimal('400.00'))
+
+
+class OrderItemProductTest(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79123456789',
+            address='Москва, Красная площадь, 1',
+        )
+        self.burger = Product.objects.create(name='Бургер', price=100)
+        self.fries = Product.objects.create(name='Картошка', price=50)
+
+    def test_name_follows_product_change(self):
+        item = OrderItem.objects.create(order=self.order, product=self.burger, quantity=1, price=100)
+        self.assertEqual(item.product_name, 'Бургер')
+
+        item = OrderItem.objects.get(pk=item.pk)
+        item.product_id = self.fries.id
+        item.save()
+
+        self.assertEqual(OrderItem.objects.get(pk=item.pk).product_name, 'Картошка')
+
+    def test_name_snapshot_survives_product_rename(self):
+        item = OrderItem.objects.create(order=self.order, product=self.burger, quantity=1, price=100)
+        self.burger.name = 'Чизбургер'
+        self.burger.save()
+
+        item = OrderItem.objects.get(pk=item.pk)
+        item.quantity = 2
+        item.save()
+
+        self.assertEqual(OrderItem.objects.get(pk=item.pk).product_name, 'Бургер')
+
+    def test_backfill_links_items_by_product_name(self):
+        migration = import_module('foodcartapp.migrations.0058_fill_orderitem_product')
+        for product_name in ['Бургер', 'Картошка', 'Бургер', 'Снятый с продажи']:
+            OrderItem.objects.create(order=self.order, product_name=product_name, quantity=1, price=10)
+
+        with mock.patch.object(migration, 'BATCH_SIZE', 3):
+            migration.fill_order_item_products(apps, schema_editor=None)
+
+        self.assertEqual(
+            list(OrderItem.objects.order_by('id').values_list('product_name', 'product_id')),
+            [
+                ('Бургер', self.burger.id),
+                ('Картошка', self.fries.id),
+                ('Бургер', self.burger.id),
+                ('Снятый с продажи', None),
+            ],
+        )
+
+
+class ProductListApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.restaurant = Restaurant.objects.create(name='Star Burger')
+        self.burger = Product.objects.create(name='Бургер', price=100)
+        RestaurantMenuItem.objects.create(restaurant=self.restaurant, product=self.burger)
+
+    def test_unchanged_menu_is_not_modified(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_changed_menu_gets_new_etag(self):
+        etag = self.client.get('/api/products/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.burger.price = 120
+            self.burger.save()
+
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['price'], '120.00')
+
+    def test_etag_depends_on_representation(self):
+        identity_response = self.client.get('/api/products/')
+        gzip_response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(gzip_response['Content-Encoding'], 'gzip')
+        self.assertNotEqual(identity_response['ETag'], gzip_response['ETag'])
+        response = self.client.get(
+            '/api/products/', HTTP_IF_NONE_MATCH=identity_response['ETag'],
+            HTTP_ACCEPT_ENCODING='gzip',
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_refused_encodings_are_not_used(self):
+        encodings = [
+            ('gzip;q=0, identity', None),
+            ('gzip;q=0.5, br;q=0', 'gzip'),
+            ('*;q=0, identity;q=1', None),
+            ('br;q=0.5, gzip', 'gzip'),
+        ]
+        for accept_encoding, content_encoding in encodings:
+            with self.subTest(accept_encoding):
+                response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING=accept_encoding)
+
+                self.assertEqual(response.get('Content-Encoding'), content_encoding)
+
+    def test_msgpack_is_sent_only_when_preferred(self):
+        formats = [
+            ('application/msgpack', 'application/msgpack'),
+            ('application/msgpack;q=0, application/json', 'application/json'),
+            ('application/json, application/msgpack;q=0.5', 'application/json'),
+            ('*/*', 'application/json'),
+        ]
+        for accept, content_type in formats:
+            with self.subTest(accept):
+                response = self.client.get('/api/products/', HTTP_ACCEPT=accept)
+
+                self.assertEqual(response['Content-Type'], content_type)
+
+    def test_restaurant_menu(self):
+        response = self.client.get('/api/products/', {'restaurant': self.restaurant.id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Restaurant-Id'], str(self.restaurant.id))
+        self.assertEqual([product['id'] for product in response.json()], [self.burger.id])
+
+    def test_unknown_restaurant_is_not_found(self):
+        response = self.client.get('/api/products/', {'restaurant': self.restaurant.id + 1})
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_coordinates_are_rejected(self):
+        invalid_coordinates = [
+            {'lat': 'inf', 'lon': '37.6'},
+            {'lat': '1e308', 'lon': '37.6'},
+            {'lat': 'nan', 'lon': '37.6'},
+            {'lat': '91', 'lon': '37.6'},
+            {'lat': '55.7', 'lon': '-180.5'},
+            {'lat': '55.7'},
+        ]
+        for coordinates in invalid_coordinates:
+            with self.subTest(**coordinates):
+                response = self.client.get('/api/products/', coordinates)
+
+                self.assertEqual(response.status_code, 400)
+
+
+class ProductChangesApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.restaurant = Restaurant.objects.create(name='Star Burger')
+        self.burger = Product.objects.create(name='Бургер', price=100)
+        self.fries = Product.objects.create(name='Картофель фри', price=50)
+        for product in [self.burger, self.fries]:
+            RestaurantMenuItem.objects.create(restaurant=self.restaurant, product=product)
+
+    def get_version(self):
+        return CatalogueChange.objects.order_by('-id').first().id
+
+    def get_changes(self, since):
+        response = self.client.get('/api/products/changes/', {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def age_changes(self):
+        """Move the logged changes apart and out of the safety window."""
+        changes = CatalogueChange.objects.order_by('-id')
+        for age, change in enumerate(changes, start=1):
+            change.created_at = timezone.now() - age * timedelta(hours=1)
+            change.save()
+
+    def test_changed_and_removed_products(self):
+        self.age_changes()
+        since = self.get_version()
+        self.burger.price = 120
+        self.burger.save()
+        fries_id = self.fries.id
+        self.fries.delete()
+
+        changes = self.get_changes(since)
+
+        self.assertFalse(changes['reset'])
+        self.assertEqual([product['id'] for product in changes['changed']], [self.burger.id])
+        self.assertEqual(changes['changed'][0]['price'], '120.00')
+        self.assertEqual(changes['removed'], [fries_id])
+
+    def test_no_changes(self):
+        self.age_changes()
+
+        changes = self.get_changes(self.get_version())
+
+        self.assertEqual((changes['changed'], changes['removed']), ([], []))
+
+    def test_reset_after_bulk_change(self):
+        since = self.get_version()
+        bump_catalogue_version()
+
+        self.assertTrue(self.get_changes(since)['reset'])
+
+    def test_reset_when_log_is_pruned(self):
+        since = self.get_version()
+        self.burger.save()
+        CatalogueChange.objects.filter(id__lte=since).delete()
+
+        self.assertTrue(self.get_changes(since)['reset'])
+
+    def test_change_committed_after_later_one_is_returned(self):
+        self.age_changes()
+        # the burger change took a lower id but became visible later
+        late_change = CatalogueChange.objects.create(product_id=self.burger.id)
+        since = CatalogueChange.objects.create(product_id=self.fries.id).id
+        CatalogueChange.objects.filter(pk=late_change.pk).update(created_at=timezone.now())
+
+        changes = self.get_changes(since)
+
+        self.assertIn(self.burger.id, [product['id'] for product in changes['changed']])
+
+
+class RestaurantMenuApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.first_restaurant = Restaurant.objects.create(name='Star Burger Арбат')
+        self.second_restaurant = Restaurant.objects.create(name='Star Burger Таганка')
+        self.burger = Product.objects.create(name='Бургер', price=100)
+        self.fries = Product.objects.create(name='Картофель фри', price=50)
+        RestaurantMenuItem.objects.create(restaurant=self.first_restaurant, product=self.burger)
+        RestaurantMenuItem.objects.create(restaurant=self.second_restaurant, product=self.fries)
+
+    def get_product_ids(self, restaurant):
+        response = self.client.get('/api/products/', {'restaurant': restaurant.id})
+        self.assertEqual(response.status_code, 200)
+        return [product['id'] for product in response.json()]
+
+    def test_menu_is_limited_to_restaurant(self):
+        self.assertEqual(self.get_product_ids(self.first_restaurant), [self.burger.id])
+        self.assertEqual(self.get_product_ids(self.second_restaurant), [self.fries.id])
+
+    def test_menu_item_change_updates_menu(self):
+        self.get_product_ids(self.first_restaurant)
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantMenuItem.objects.create(restaurant=self.first_restaurant, product=self.fries)
+            menu_item = self.second_restaurant.menu_items.get()
+            menu_item.availability = False
+            menu_item.save()
+
+        self.assertEqual(
+            sorted(self.get_product_ids(self.first_restaurant)),
+            [self.burger.id, self.fries.id],
+        )
+        self.assertEqual(self.get_product_ids(self.second_restaurant), [])
+
+    def test_malformed_restaurant(self):
+        response = self.client.get('/api/products/', {'restaurant': 'first'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductSearchIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.index = ProductSearchIndex()
+        restaurant = Restaurant.objects.create(name='Star Burger')
+        category = ProductCategory.objects.create(name='Напитки')
+        products = [
+            Product.objects.create(name='Чизбургер', price=100, description='С сырным соусом'),
+            Product.objects.create(name='Острый бургер', price=150),
+            Product.objects.create(name='Ёлочный морс', price=50, category=category),
+        ]
+        self.cheeseburger, self.hot_burger, self.juice = products
+        for product in products:
+            RestaurantMenuItem.objects.create(restaurant=restaurant, product=product)
+
+    def search(self, query):
+        return [product['id'] for product in self.index.search(query)]
+
+    def test_matches_word_forms_and_case(self):
+        self.assertEqual(self.search('БУРГЕРЫ'), [self.hot_burger.id])
+        self.assertEqual(self.search('сырный'), [self.cheeseburger.id])
+        self.assertEqual(self.search('елочные напитки'), [self.juice.id])
+        self.assertEqual(self.search('остр бург'), [self.hot_burger.id])
+        self.assertEqual(self.search('пицца'), [])
+
+    def test_follows_product_changes(self):
+        self.search('бургер')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hot_burger.name = 'Острая пицца'
+            self.hot_burger.save()
+            self.juice.delete()
+
+        self.assertEqual(self.search('бургер'), [])
+        self.assertEqual(self.search('острая'), [self.hot_burger.id])
+        self.assertEqual(self.search('морс'), [])
+
+
+class IdempotentOrderTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        restaurant = Restaurant.objects.create(name='Star Burger')
+        self.product = Product.objects.create(name='Бургер', price=100)
+        RestaurantMenuItem.objects.create(restaurant=restaurant, product=self.product)
+
+    def post_order(self, key, quantity=1):
+        return self.client.post('/api/order/', {
+            'products': [{'product': self.product.id, 'quantity': quantity}],
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79123456789',
+            'address': 'Москва, Красная площадь, 1',
+        }, content_type='application/json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_returns_stored_response(self):
+        response = self.post_order('checkout-1')
+        self.assertEqual(response.status_code, 201)
+
+        # the stored key lookup only
+        with self.assertNumQueries(1):
+            replayed_response = self.post_order('checkout-1')
+
+        self.assertEqual(replayed_response.status_code, 201)
+        self.assertEqual(replayed_response['Idempotent-Replayed'], 'true')
+        self.assertEqual(replayed_response.json(), response.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_for_another_order(self):
+        self.post_order('checkout-1')
+
+        response = self.post_order('checkout-1', quantity=2)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_concurrent_key_without_stored_response_conflicts(self):
+        with mock.patch('foodcartapp.views.store_response', side_effect=IntegrityError):
+            response = self.post_order('checkout-1')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+    def test_concurrent_key_replays_stored_response(self):
+        stored_response = (201, {'message': 'Order created successfully'})
+        with mock.patch('foodcartapp.views.store_response', side_effect=IntegrityError):
+            with mock.patch('foodcartapp.views.get_stored_response', side_effect=[None, stored_response]):
+                response = self.post_order('checkout-1')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertFalse(Order.objects.exists())
+
+
+class QueuedOrderTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        restaurant = Restaurant.objects.create(name='Star Burger')
+        self.product = Product.objects.create(name='Бургер', price=100)
+        self.menu_item = RestaurantMenuItem.objects.create(restaurant=restaurant, product=self.product)
+
+    def enqueue_order(self, products):
+        return self.client.post('/api/order/async/', {
+            'products': [{'product': product_id, 'quantity': 1} for product_id in products],
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79123456789',
+            'address': 'Москва, Красная площадь, 1',
+        }, content_type='application/json')
+
+    def get_status(self, token):
+        response = self.client.get(f'/api/order/async/{token}/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_order_is_enqueued(self):
+        response = self.enqueue_order([self.product.id])
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.get_status(response.json()['token'])['status'], QueuedOrder.PENDING)
+        self.assertFalse(Order.objects.exists())
+
+    def test_invalid_order_is_not_enqueued(self):
+        response = self.enqueue_order([self.product.id + 1])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(QueuedOrder.objects.exists())
+
+    def test_queued_order_is_processed(self):
+        token = self.enqueue_order([self.product.id]).json()['token']
+
+        self.assertEqual(process_queued_orders(), 1)
+
+        status = self.get_status(token)
+        self.assertEqual(status['status'], QueuedOrder.PROCESSED)
+        order = Order.objects.get(id=status['order_id'])
+        self.assertEqual(order.fixed_total_price, 100)
+        self.assertEqual(process_queued_orders(), 0)
+
+    def test_order_invalid_at_processing_fails(self):
+        token = self.enqueue_order([self.product.id]).json()['token']
+        self.menu_item.delete()
+
+        self.assertEqual(process_queued_orders(), 1)
+
+        status = self.get_status(token)
+        self.assertEqual(status['status'], QueuedOrder.FAILED)
+        self.assertIsNone(status['order_id'])
+        self.assertIn(str(self.product.id), status['error'])
+        self.assertFalse(Order.objects.exists())
+
+
+class MenuImportTest(TestCase):
+    def setUp(self):
+        self.restaurant = Restaurant.objects.create(name='Star Burger')
+        self.burger = Product.objects.create(name='Бургер', price=100)
+        RestaurantMenuItem.objects.create(restaurant=self.restaurant, product=self.burger)
+
+    def import_menu(self, products, *args):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'menu.json'
+            path.write_text(json.dumps(products), encoding='utf-8')
+            stdout = StringIO()
+            call_command('import_menu', str(path), *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def build_menu(self, burger_price=100, fries_available=True):
+        return [
+            {'name': 'Бургер', 'price': burger_price, 'restaurants': {'Star Burger': True}},
+            {
+                'name': 'Картошка',
+                'category': 'Гарниры',
+                'price': '50.00',
+                'restaurants': {'Star Burger': fries_available},
+            },
+        ]
+
+    def test_creates_and_updates_products(self):
+        output = self.import_menu(self.build_menu(burger_price=120))
+
+        self.assertIn('created products: 1', output)
+        self.assertIn('updated products: 1', output)
+        self.burger.refresh_from_db()
+        self.assertEqual(self.burger.price, Decimal('120.00'))
+        fries = Product.objects.get(name='Картошка')
+        self.assertEqual(fries.category.name, 'Гарниры')
+        self.assertTrue(fries.menu_items.get(restaurant=self.restaurant).availability)
+
+    def test_unchanged_menu_is_not_touched(self):
+        self.import_menu(self.build_menu())
+        changes_count = CatalogueChange.objects.count()
+
+        # one read per table and two savepoints with their releases
+        with self.assertNumQueries(8):
+            output = self.import_menu(self.build_menu())
+
+        self.assertIn('Menu is up to date', output)
+        self.assertEqual(CatalogueChange.objects.count(), changes_count)
+
+    def test_dry_run_saves_nothing(self):
+        output = self.import_menu(self.build_menu(burger_price=120), '--dry-run')
+
+        self.assertIn('Dry run, nothing is saved', output)
+        self.burger.refresh_from_db()
+        self.assertEqual(self.burger.price, Decimal('100.00'))
+        self.assertFalse(Product.objects.filter(name='Картошка').exists())
+
+    def test_duplicate_products_are_rejected(self):
+        menu = self.build_menu() + [{'name': ' Картошка ', 'price': 60}]
+
+        with self.assertRaisesMessage(CommandError, 'Duplicate products: Картошка'):
+            self.import_menu(menu)
+
+        self.assertFalse(Product.objects.filter(name='Картошка').exists())
+
+    def test_malformed_products_are_rejected(self):
+        malformed_products = [
+            ['Бургер'],
+            {'name': 42, 'price': 100},
+            {'name': 'Бургер', 'price': 100, 'category': 7},
+            {'name': 'Бургер', 'price': 'NaN'},
+            {'name': 'Бургер', 'price': -1},
+            {'name': 'Бургер', 'price': 100, 'restaurants': ['Star Burger']},
+        ]
+        for product in malformed_products:
+            with self.subTest(product=product):
+                with self.assertRaises(CommandError):
+                    self.import_menu([product])
+
+
+class CatalogueIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_index_is_built_from_default_database_under_replica(self):
+        router = ReplicaRouter()
+        read_databases = []
+        index = CatalogueIndex(
+            'test:index:{version}',
+            lambda: read_databases.append(router.db_for_read(Product)),
+        )
+
+        with mock.patch('star_burger.db.get_read_database', return_value='replica'):
+            with use_replica():
+                self.assertEqual(router.db_for_read(Product), 'replica')
+                index.get()
+
+        self.assertEqual(read_databases, [None])
+
+
+class OrderExportTest(TestCase):
+    def setUp(self):
+        # orders with 0, 1, 3, 0 and 2 items, read in chunks of 2 rows
+        chunk_size_patch = mock.patch('foodcartapp.exports.CHUNK_SIZE', 2)
+        chunk_size_patch.start()
+        self.addCleanup(chunk_size_patch.stop)
+        self.orders = []
+        for day, items_count in enumerate([0, 1, 3, 0, 2], start=1):
+            order = Order.objects.create(
+                firstname='Иван',
+                lastname='Петров',
+                phonenumber='+79123456789',
+                address='Москва, Красная площадь, 1',
+                status=Order.RECEIVED if day == 3 else Order.ACCEPTED,
+            )
+            created_at = timezone.make_aware(datetime(2024, 1, day, 23, 59, 59))
+            Order.objects.filter(pk=order.pk).update(created_at=created_at)
+            for number in range(items_count):
+                OrderItem.objects.create(
+                    order=order, product_name=f'Бургер {number}', quantity=1, price=100,
+                )
+            self.orders.append(order)
+
+    def get_exported_items(self, orders):
+        return [
+            (order['id'], [item['product_name'] for item in items])
+            for order, items in iter_orders_with_items(orders)
+        ]
+
+    def test_orders_are_merged_with_their_items(self):
+        self.assertEqual(self.get_exported_items(Order.objects.all()), [
+            (self.orders[0].id, []),
+            (self.orders[1].id, ['Бургер 0']),
+            (self.orders[2].id, ['Бургер 0', 'Бургер 1', 'Бургер 2']),
+            (self.orders[3].id, []),
+            (self.orders[4].id, ['Бургер 0', 'Бургер 1']),
+        ])
+
+    def test_filters(self):
+        filters = [
+            ({'date_from': date(2024, 1, 2), 'date_to': date(2024, 1, 4)}, [1, 2, 3]),
+            ({'date_from': date(2024, 1, 5)}, [4]),
+            ({'date_to': date(2024, 1, 1)}, [0]),
+            ({'statuses': [Order.RECEIVED]}, [2]),
+            ({'date_from': date(2024, 1, 2), 'statuses': [Order.ACCEPTED]}, [1, 3, 4]),
+        ]
+        for order_filter, order_numbers in filters:
+            with self.subTest(**order_filter):
+                exported_items = self.get_exported_items(filter_orders(**order_filter))
+
+                self.assertEqual(
+                    [order_id for order_id, _ in exported_items],
+                    [self.orders[number].id for number in order_numbers],
+                )
+
+    def test_csv_has_a_row_per_item(self):
+        rows = list(csv.reader(''.join(export_orders(Order.objects.all(), 'csv')).splitlines()))
+
+        self.assertEqual(rows[0], ORDER_FIELDS + ORDER_ITEM_FIELDS)
+        self.assertEqual(len(rows), 1 + 1 + 1 + 3 + 1 + 2)
+        empty_order_row = rows[1]
+        self.assertEqual(empty_order_row[0], str(self.orders[0].id))
+        self.assertEqual(empty_order_row[len(ORDER_FIELDS):], ['', '', '', ''])
+        self.assertEqual(rows[2][len(ORDER_FIELDS):], ['', 'Бургер 0', '1', '100.00'])
+
+    def test_jsonl_has_a_line_per_order(self):
+        lines = ''.join(export_orders(Order.objects.all(), 'jsonl')).splitlines()
+
+        orders = [json.loads(line) for line in lines]
+        self.assertEqual([order['id'] for order in orders], [order.id for order in self.orders])
+        self.assertEqual(orders[2]['fixed_total_price'], '300.00')
+        self.assertEqual(
+            orders[4]['items'][1],
+            {'product_id': None, 'product_name': 'Бургер 1', 'quantity': 1, 'fixed_price': '100.00'},
+        )
+
+    def get_export(self, user, **params):
+        self.client.force_login(user)
+        return self.client.get('/admin/foodcartapp/order/export/', params)
+
+    def test_export_view(self):
+        admin = User.objects.create_superuser('admin', password='secret')
+
+        response = self.get_export(admin, format='jsonl', status=Order.RECEIVED, to='2024-01-03')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.orders[2].id])
+
+    def test_export_view_rejects_bad_parameters(self):
+        admin = User.objects.create_superuser('admin', password='secret')
+
+        self.assertEqual(self.get_export(admin, format='xml').status_code, 400)
+        self.assertEqual(self.get_export(admin, **{'from': '01.01.2024'}).status_code, 400)
+
+    def test_export_view_requires_permission(self):
+        customer = User.objects.create_user('customer', password='secret')
+        response = self.get_export(customer)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/admin/login/', response['Location'])
+
+        manager = User.objects.create_user('manager', password='secret', is_staff=True)
+        self.assertEqual(self.get_export(manager).status_code, 403)
+
+
+class RenditionsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name, MEDIA_URL='/media/')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_product(self, image_name, content):
+        if content is not None:
+            default_storage.save(image_name, ContentFile(content))
+        return Product.objects.create(name='Бургер', price=100, image=image_name)
+
+    def build_image(self, size=(800, 600)):
+        output = BytesIO()
+        Image.new('RGB', size, 'orange').save(output, 'PNG')
+        return output.getvalue()
+
+    def test_renditions_are_named_by_content(self):
+        content = self.build_image()
+        product = self.create_product('burger.png', content)
+
+        renditions = get_renditions(product.image)
+
+        content_hash = hashlib.sha1(content).hexdigest()[:16]
+        self.assertEqual(set(renditions), {'small', 'medium'})
+        for size_name, size in RENDITION_SIZES.items():
+            self.assertEqual(set(renditions[size_name]), set(get_available_formats()))
+            url = renditions[size_name]['jpeg']
+            self.assertEqual(url, f'/media/thumbnails/{content_hash}_{size_name}.jpg')
+            with default_storage.open(url[len('/media/'):]) as rendition_file:
+                rendition = Image.open(rendition_file)
+                self.assertEqual(rendition.format, 'JPEG')
+                self.assertLessEqual(rendition.width, size[0])
+                self.assertLessEqual(rendition.height, size[1])
+
+    def test_existing_renditions_are_reused(self):
+        content = self.build_image()
+        product = self.create_product('burger.png', content)
+        renditions = get_renditions(product.image)
+        default_storage.save('burger-copy.png', ContentFile(content))
+
+        with mock.patch.object(default_storage, 'save', wraps=default_storage.save) as save:
+            copy = Product.objects.create(name='Бургер', price=100, image='burger-copy.png')
+            self.assertEqual(get_renditions(copy.image), renditions)
+
+        save.assert_not_called()
+
+    def test_missing_or_broken_image_falls_back(self):
+        images = [('missing.png', None), ('broken.png', b'not an image')]
+        for image_name, content in images:
+            with self.subTest(image_name):
+                with mock.patch('foodcartapp.thumbnails.generate_renditions', wraps=generate_renditions) as generate:
+                    with self.assertLogs('foodcartapp.thumbnails', 'WARNING'):
+                        product = self.create_product(image_name, content)
+                    # the failure is cached, the file is not opened again
+                    self.assertEqual(get_renditions(product.image), {})
+                    self.assertEqual(get_renditions(product.image), {})
+
+                self.assertEqual(generate.call_count, 1)
+
+    def test_product_without_image(self):
+        self.assertEqual(get_renditions(Product(name='Бургер', price=100).image), {})
+
+
+class InstrumentationMiddlewareTest(TestCase):
+    def get_histogram(self, name):
+        return registry.histograms[name]['unresolved']
+
+    def test_sync_request(self):
+        def view(request):
+            Order.objects.count()
+            return HttpResponse('ok')
+
+        middleware = InstrumentationMiddleware(view)
+        queries_count = self.get_histogram('starburger_request_db_queries').sum
+
+        middleware(RequestFactory().get('/'))
+
+        self.assertFalse(asyncio.iscoroutinefunction(middleware))
+        self.assertEqual(self.get_histogram('starburger_request_db_queries').sum, queries_count + 1)
+
+    def test_async_request_stays_async(self):
+        async def view(request):
+            await sync_to_async(Order.objects.count)()
+            return HttpResponse('ok')
+
+        middleware = InstrumentationMiddleware(view)
+        queries_count = self.get_histogram('starburger_request_db_queries').sum
+
+        response = async_to_sync(middleware)(RequestFactory().get('/'))
+
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        self.assertEqual(response.content, b'ok')
+        self.assertEqual(self.get_histogram('starburger_request_db_queries').sum, queries_count + 1)
+
+
+class ConnectionHealthCheckMiddlewareTest(TestCase):
+    def test_async_request_stays_async(self):
+        async def view(request):
+            return HttpResponse('ok')
+
+        with mock.patch.dict(settings.DATABASES['default'], CONN_HEALTH_CHECKS=True):
+            middleware = ConnectionHealthCheckMiddleware(view)
+
+        response = async_to_sync(middleware)(RequestFactory().get('/'))
+
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        self.assertEqual(response.content, b'ok')
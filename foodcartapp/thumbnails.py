@@ -0,0 +1,88 @@
+import hashlib
+import logging
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, features
+
+logger = logging.getLogger(__name__)
+
+THUMBNAILS_DIR = 'thumbnails'
+THUMBNAILS_KEY = 'thumbnails:{name}'
+# a missing or broken image is retried only after this many seconds
+THUMBNAILS_FAILURE_TIMEOUT = 5 * 60
+RENDITION_SIZES = {
+    'small': (200, 200),
+    'medium': (400, 400),
+}
+RENDITION_FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 6}),
+}
+
+
+def get_available_formats():
+    if features.check('webp'):
+        return RENDITION_FORMATS
+    return {'jpeg': RENDITION_FORMATS['jpeg']}
+
+
+def render_thumbnail(image, size, image_format, save_params):
+    thumbnail = image.copy()
+    thumbnail.thumbnail(size, Image.LANCZOS)
+    if image_format == 'JPEG' and thumbnail.mode != 'RGB':
+        thumbnail = thumbnail.convert('RGB')
+    output = BytesIO()
+    thumbnail.save(output, image_format, **save_params)
+    return output.getvalue()
+
+
+def generate_renditions(image_file):
+    """Resize and recompress the image into every rendition.
+
+    Files are named after the hash of the source content, so renditions of
+    an unchanged image are generated only once and never go stale.
+    Return a `size -> format -> url` dict.
+    """
+    with image_file.open('rb'):
+        content = image_file.read()
+    content_hash = hashlib.sha1(content).hexdigest()[:16]
+
+    renditions = {}
+    image = None
+    for size_name, size in RENDITION_SIZES.items():
+        renditions[size_name] = {}
+        for format_name, (image_format, extension, save_params) in get_available_formats().items():
+            name = f'{THUMBNAILS_DIR}/{content_hash}_{size_name}.{extension}'
+            if not default_storage.exists(name):
+                if image is None:
+                    image = Image.open(BytesIO(content))
+                    image.load()
+                thumbnail = render_thumbnail(image, size, image_format, save_params)
+                name = default_storage.save(name, ContentFile(thumbnail))
+            renditions[size_name][format_name] = default_storage.url(name)
+    return renditions
+
+
+def get_renditions(image_file):
+    """Return rendition URLs of a product image, generating them lazily.
+
+    An empty dict is returned when the image is missing or broken, so
+    callers fall back to the original image. The failure is cached for
+    THUMBNAILS_FAILURE_TIMEOUT, so the file is not opened on every call.
+    """
+    if not image_file:
+        return {}
+    key = THUMBNAILS_KEY.format(name=image_file.name)
+    renditions = cache.get(key)
+    if renditions is None:
+        try:
+            renditions = generate_renditions(image_file)
+        except (OSError, ValueError) as error:
+            logger.warning('Could not make thumbnails of %s: %s', image_file.name, error)
+            cache.set(key, {}, THUMBNAILS_FAILURE_TIMEOUT)
+            return {}
+        cache.set(key, renditions, None)
+    return renditions
@@ -1,12 +1,18 @@
 from django.urls import path, include
 
-from .views import product_list_api, banners_list_api, register_order
+from .views import (banners_list_api, enqueue_order, product_changes_api,
+                    product_list_api, product_search_api, queued_order_status,
+                    register_order)
 
 
 app_name = "foodcartapp"
 
 urlpatterns = [
     path('products/', product_list_api),
+    path('products/changes/', product_changes_api),
+    path('products/search/', product_search_api),
     path('banners/', banners_list_api),
     path('order/', register_order),
+    path('order/async/', enqueue_order),
+    path('order/async/<uuid:token>/', queued_order_status),
 ]
@@ -1,16 +1,97 @@
+import json
 import logging
+import math
 
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
 from django.templatetags.static import static
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+from places.spatial import restaurant_index
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
-from .models import Product
+from .availability import menu_index
+from .catalogue import (MENU_CONTENT_TYPES, get_available_encodings,
+                        get_available_formats, get_catalogue_changes,
+                        get_catalogue_version, get_menu_snapshot)
+from .idempotency import (MAX_KEY_LENGTH, IdempotencyKeyReused,
+                          get_request_hash, get_stored_response,
+                          store_response)
+from .models import QueuedOrder, Restaurant
+from .search import product_search_index
 from .serializers import OrderSerializer
 
 logger = logging.getLogger(__name__)
 
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+
+def get_json_dumps_params(request):
+    if request.GET.get('pretty') == '1':
+        return {'ensure_ascii': False, 'indent': 4}
+    return {'ensure_ascii': False, 'separators': (',', ':')}
+
+
+def parse_quality_values(header):
+    """Map every item of an Accept-* header to its q-value."""
+    quality_values = {}
+    for item in header.split(','):
+        token, *params = item.split(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        quality_values[token] = quality if 0 <= quality <= 1 else 0.0
+    return quality_values
+
+
+def negotiate_menu_representation(request):
+    """Pick (format, encoding, pretty) of the menu from the request headers.
+
+    Items with q=0 are refused. msgpack is sent only when the client names
+    it explicitly and weighs it no less than JSON; identity is the
+    fallback encoding unless the client names a better one.
+    """
+    accepted_types = parse_quality_values(request.headers.get('Accept', ''))
+    json_quality = accepted_types.get(
+        'application/json',
+        accepted_types.get('application/*', accepted_types.get('*/*', 0.0 if accepted_types else 1.0)),
+    )
+    msgpack_quality = max(
+        (quality for media_type, quality in accepted_types.items() if media_type.endswith('msgpack')),
+        default=0.0,
+    )
+    menu_format = 'json'
+    if 'msgpack' in get_available_formats() and msgpack_quality and msgpack_quality >= json_quality:
+        menu_format = 'msgpack'
+
+    accepted_encodings = parse_quality_values(request.headers.get('Accept-Encoding', ''))
+
+    def get_encoding_quality(encoding):
+        if encoding in accepted_encodings:
+            return accepted_encodings[encoding]
+        if '*' in accepted_encodings:
+            return accepted_encodings['*']
+        return 0.0
+
+    encoding = max(get_available_encodings(), key=get_encoding_quality)
+    if not get_encoding_quality(encoding):
+        encoding = 'identity'
+    pretty = menu_format == 'json' and request.GET.get('pretty') == '1'
+    return menu_format, encoding, pretty
+
 
 def banners_list_api(request):
     # FIXME move data to db?
@@ -30,44 +111,213 @@ def banners_list_api(request):
             'src': static('tasty.jpg'),
             'text': 'Food is incomplete without a tasty dessert',
         }
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    ], safe=False, json_dumps_params=get_json_dumps_params(request))
+
+
+def parse_coordinate(request, name, limit):
+    try:
+        value = float(request.GET[name])
+    except KeyError:
+        raise ValueError('lat and lon must be given together')
+    if not math.isfinite(value) or abs(value) > limit:
+        raise ValueError(f'{name} must be a number between -{limit} and {limit}')
+    return value
+
+
+def get_menu_restaurant_id(request):
+    """Return id of the restaurant whose menu is requested, if any.
+
+    The restaurant is given either by `restaurant` id or by the customer
+    `lat` and `lon`, then the nearest restaurant with a menu is taken.
+    Raise ValueError on malformed parameters and Restaurant.DoesNotExist
+    when there is no such restaurant.
+    """
+    if 'restaurant' in request.GET:
+        restaurant_id = int(request.GET['restaurant'])
+        restaurant_exists = (
+            restaurant_id in menu_index.get()
+            or Restaurant.objects.filter(id=restaurant_id).exists()
+        )
+        if not restaurant_exists:
+            raise Restaurant.DoesNotExist(f'restaurant {restaurant_id} does not exist')
+        return restaurant_id
+    if 'lat' not in request.GET and 'lon' not in request.GET:
+        return None
+    point = parse_coordinate(request, 'lat', 90), parse_coordinate(request, 'lon', 180)
+    nearest = restaurant_index.nearest(point, restaurant_ids=menu_index.get().keys())
+    if not nearest:
+        raise Restaurant.DoesNotExist('no restaurant nearby')
+    restaurant_id, distance = nearest[0]
+    return restaurant_id
 
 
 def product_list_api(request):
-    products = Product.objects.select_related('category').available()
-
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'special_status': product.special_status,
-            'description': product.description,
-            'category': {
-                'id': product.category.id,
-                'name': product.category.name,
-            } if product.category else None,
-            'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
-            }
-        }
-        dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    """Return available products of the catalogue or of a single restaurant."""
+    try:
+        restaurant_id = get_menu_restaurant_id(request)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    except Restaurant.DoesNotExist as error:
+        return JsonResponse({'error': str(error)}, status=404)
+
+    menu_format, encoding, pretty = negotiate_menu_representation(request)
+    product_ids, scope = None, 'all'
+    if restaurant_id is not None:
+        product_ids = menu_index.get_product_ids(restaurant_id)
+        scope = f'restaurant-{restaurant_id}'
+
+    token, modified_at = get_catalogue_version()
+    etag = quote_etag(f'{token}-{scope}-{menu_format}-{encoding}{"-pretty" if pretty else ""}')
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(modified_at.timestamp())
+    )
+    if response is None:
+        body, token, modified_at = get_menu_snapshot(
+            menu_format, encoding, pretty, product_ids, scope
+        )
+        response = HttpResponse(body, content_type=MENU_CONTENT_TYPES[menu_format])
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+        response['X-Catalogue-Version'] = token
+        if restaurant_id is not None:
+            response['X-Restaurant-Id'] = restaurant_id
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified_at.timestamp())
+    patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def product_search_api(request):
+    """Return available products matching every word of `q`."""
+    try:
+        limit = min(int(request.GET.get('limit', SEARCH_LIMIT)), MAX_SEARCH_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number'}, status=400)
+    products = product_search_index.search(request.GET.get('q', ''), limit)
+    return JsonResponse(products, safe=False, json_dumps_params=get_json_dumps_params(request))
+
+
+def product_changes_api(request):
+    """Return products changed since the catalogue version given in `since`.
+
+    `changed` holds full products which were added or changed, `removed`
+    holds ids of products deleted or no longer available. With `reset: true`
+    the client has to reload the full /api/products/ list.
+    """
+    try:
+        since = int(request.GET['since'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'since must be a catalogue version'}, status=400)
+
+    token, modified_at = get_catalogue_version()
+    changes = get_catalogue_changes(since)
+    if changes is None:
+        return JsonResponse({'version': token, 'reset': True})
+
+    changed_products, removed_product_ids = changes
+    return JsonResponse({
+        'version': token,
+        'reset': False,
+        'changed': changed_products,
+        'removed': removed_product_ids,
+    }, json_dumps_params=get_json_dumps_params(request))
 
 
 @api_view(['POST'])
 def register_order(request):
-    serializer = OrderSerializer(data=request.data)
-    if serializer.is_valid():
-        order = serializer.save()
-        return Response({"message": "Order created successfully", "order": serializer.data}, status=status.HTTP_201_CREATED)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    """Create an order.
+
+    With an `Idempotency-Key` header a retry of the same request returns
+    the stored response of the first one instead of creating the order
+    again.
+    """
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key is None:
+        serializer = OrderSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response({"message": "Order created successfully", "order": serializer.data}, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+        return Response(
+            {'error': f'Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters long'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    request_hash = get_request_hash(request)
+    try:
+        stored_response = get_stored_response(idempotency_key, request_hash)
+        if stored_response is not None:
+            return replay_response(*stored_response)
+
+        serializer = OrderSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with transaction.atomic():
+                order = serializer.save()
+                response_body = {"message": "Order created successfully", "order": serializer.data}
+                store_response(idempotency_key, request_hash, order, status.HTTP_201_CREATED, response_body)
+        except IntegrityError:
+            # a concurrent request with the same key committed first
+            stored_response = get_stored_response(idempotency_key, request_hash)
+            if stored_response is None:
+                # and its key has expired or been pruned since
+                return Response(
+                    {'error': 'A request with this Idempotency-Key conflicted, retry it'},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            return replay_response(*stored_response)
+    except IdempotencyKeyReused:
+        return Response(
+            {'error': 'Idempotency-Key was already used for another request'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(response_body, status=status.HTTP_201_CREATED)
+
+
+def replay_response(response_status, response_body):
+    response = Response(response_body, status=response_status)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+async def enqueue_order(request):
+    """Accept an order asynchronously and leave it to the queue consumer.
+
+    The payload is validated right away, but the order itself is created
+    later by the `process_order_queue` command. The response carries a token
+    to check the order status.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    serializer = OrderSerializer(data=payload)
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400)
+
+    queued_order = await sync_to_async(QueuedOrder.objects.create)(payload=payload)
+    return JsonResponse({
+        'token': queued_order.token,
+        'status': queued_order.status,
+    }, status=202)
+
+
+# DRF views are CSRF exempt, so the async intake is too. The csrf_exempt
+# decorator would wrap the coroutine into a sync function.
+enqueue_order.csrf_exempt = True
+
+
+async def queued_order_status(request, token):
+    queued_order = await sync_to_async(
+        QueuedOrder.objects.filter(token=token).values('status', 'order_id', 'error').first
+    )()
+    if queued_order is None:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    return JsonResponse({'token': token, **queued_order})
@@ -0,0 +1,93 @@
+from datetime import timedelta
+from math import asin, cos, radians, sin, sqrt
+
+from django.conf import settings
+from django.utils import timezone
+
+from .geocoders import get_geocoder
+from .models import Place
+
+EARTH_RADIUS_KM = 6371
+
+
+def is_place_fresh(place, now):
+    """Tell whether a stored geocoder answer may still be used.
+
+    Addresses the geocoder did not find are kept for GEOCODER_MISS_CACHE_TTL,
+    which is much shorter than GEOCODER_CACHE_TTL of the found ones.
+    """
+    ttl = settings.GEOCODER_CACHE_TTL if place.coordinates else settings.GEOCODER_MISS_CACHE_TTL
+    return place.updated_at >= now - timedelta(seconds=ttl)
+
+
+def fetch_coordinates(addresses):
+    """Return an `address -> (lat, lon) or None` dict for all given addresses.
+
+    Coordinates are taken from the Place table. Only the addresses that
+    are missing there or whose answer has expired are sent to the geocoder,
+    all in one batch. Both found and not found answers are stored;
+    addresses the geocoder failed to answer for, e.g. on a network error,
+    are not, so they are geocoded again next time.
+    """
+    addresses = {address for address in addresses if address}
+    if not addresses:
+        return {}
+
+    now = timezone.now()
+    places = Place.objects.in_bulk(addresses, field_name='address')
+    coordinates = {
+        address: place.coordinates
+        for address, place in places.items()
+        if is_place_fresh(place, now)
+    }
+
+    stale_addresses = addresses - coordinates.keys()
+    if not stale_addresses:
+        return coordinates
+
+    found_coordinates = get_geocoder().geocode(stale_addresses)
+    now = timezone.now()
+    new_places = []
+    outdated_places = []
+    for address in stale_addresses:
+        place = places.get(address)
+        if address not in found_coordinates:
+            # an expired place is still better than nothing
+            coordinates[address] = place.coordinates if place else None
+            continue
+        coordinates[address] = found_coordinates[address]
+        lat, lon = found_coordinates[address] or (None, None)
+        if place is None:
+            new_places.append(Place(address=address, lat=lat, lon=lon, updated_at=now))
+        else:
+            place.lat, place.lon, place.updated_at = lat, lon, now
+            outdated_places.append(place)
+
+    Place.objects.bulk_create(new_places, ignore_conflicts=True)
+    Place.objects.bulk_update(outdated_places, ['lat', 'lon', 'updated_at'])
+    return coordinates
+
+
+def get_stored_coordinates(addresses):
+    """Return an `address -> (lat, lon) or None` dict without geocoding.
+
+    Only answers already stored in the Place table are used, whatever
+    their age, so the lookup is a single query.
+    """
+    addresses = {address for address in addresses if address}
+    places = Place.objects.in_bulk(addresses, field_name='address')
+    return {
+        address: places[address].coordinates if address in places else None
+        for address in addresses
+    }
+
+
+def calculate_distance(start, end):
+    """Return the great-circle distance in kilometres between two points."""
+    start_lat, start_lon = map(radians, start)
+    end_lat, end_lon = map(radians, end)
+    haversine = (
+        sin((end_lat - start_lat) / 2) ** 2
+        + cos(start_lat) * cos(end_lat) * sin((end_lon - start_lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * asin(sqrt(haversine))
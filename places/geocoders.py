@@ -0,0 +1,96 @@
+import json
+import logging
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class BaseGeocoder:
+    """Interface of a geocoder backend.
+
+    A backend resolves a batch of addresses at once and returns
+    an `address -> (lat, lon) or None` dict, None meaning the address
+    is not found. Addresses it failed to resolve are left out.
+    """
+
+    def geocode(self, addresses):
+        raise NotImplementedError
+
+
+class YandexGeocoder(BaseGeocoder):
+    """Geocoder backed by the Yandex Geocoder HTTP API.
+
+    The API resolves one address per request. An address is left out
+    when the request fails, so the failure is not cached as a miss.
+    """
+
+    url = 'https://geocode-maps.yandex.ru/1.x'
+
+    def __init__(self, api_key=None, timeout=None):
+        self.api_key = api_key or settings.YANDEX_GEOCODER_API_KEY
+        self.timeout = timeout or settings.GEOCODER_TIMEOUT
+        if not self.api_key:
+            raise ImproperlyConfigured('YANDEX_GEOCODER_API_KEY is not set')
+
+    def fetch_point(self, address):
+        query = urlencode({
+            'geocode': address,
+            'apikey': self.api_key,
+            'format': 'json',
+            'results': 1,
+        })
+        with urlopen(f'{self.url}?{query}', timeout=self.timeout) as response:
+            answer = json.load(response)
+        found_places = answer['response']['GeoObjectCollection']['featureMember']
+        if not found_places:
+            return None
+        lon, lat = found_places[0]['GeoObject']['Point']['pos'].split()
+        return float(lat), float(lon)
+
+    def geocode(self, addresses):
+        found_coordinates = {}
+        for address in addresses:
+            try:
+                point = self.fetch_point(address)
+            except (OSError, ValueError, KeyError, IndexError) as error:
+                logger.warning('Failed to geocode %r: %s', address, error)
+                continue
+            found_coordinates[address] = point
+        return found_coordinates
+
+
+class FileGeocoder(BaseGeocoder):
+    """Offline geocoder reading coordinates from a local JSON file.
+
+    The file holds an object like `{"Москва, Тверская 1": [55.75, 37.61]}`.
+    It is meant for tests and local development.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or settings.GEOCODER_FILE
+
+    def load_coordinates(self):
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def geocode(self, addresses):
+        known_coordinates = self.load_coordinates()
+        found_coordinates = {}
+        for address in addresses:
+            found_coordinates[address] = None
+            if address in known_coordinates:
+                lat, lon = known_coordinates[address]
+                found_coordinates[address] = (float(lat), float(lon))
+        return found_coordinates
+
+
+def get_geocoder():
+    return import_string(settings.GEOCODER_BACKEND)()
@@ -0,0 +1,55 @@
+import random
+from timeit import default_timer
+
+from django.core.management.base import BaseCommand
+
+from places.spatial import GridIndex
+
+MOSCOW_BOUNDS = ((55.55, 55.92), (37.35, 37.85))
+
+
+def generate_points(count, bounds=MOSCOW_BOUNDS):
+    (min_lat, max_lat), (min_lon, max_lon) = bounds
+    return [
+        (random.uniform(min_lat, max_lat), random.uniform(min_lon, max_lon))
+        for _ in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Measure k-nearest restaurant lookups in the spatial index on synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=1000)
+        parser.add_argument('--lookups', type=int, default=10000)
+        parser.add_argument('-k', type=int, default=5)
+        parser.add_argument(
+            '--stocking-share',
+            type=float,
+            default=0.5,
+            help='Share of restaurants stocking every product of an order',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        grid = GridIndex()
+        for restaurant_id, point in enumerate(generate_points(options['restaurants'])):
+            grid.add(restaurant_id, point)
+
+        stocking_ids = set(random.sample(
+            range(options['restaurants']),
+            int(options['restaurants'] * options['stocking_share']),
+        ))
+        order_points = generate_points(options['lookups'])
+
+        started_at = default_timer()
+        for point in order_points:
+            grid.nearest(point, options['k'], stocking_ids.__contains__)
+        elapsed = default_timer() - started_at
+
+        self.stdout.write(
+            f'{options["lookups"]} lookups of {options["k"]} nearest '
+            f'among {options["restaurants"]} restaurants: '
+            f'{elapsed / options["lookups"] * 1000:.3f} ms per lookup'
+        )
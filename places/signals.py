@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from foodcartapp.models import Order, Restaurant
+
+from .coordinates import fetch_coordinates
+from .spatial import invalidate_restaurant_index_version
+
+
+@receiver(post_save, sender=Restaurant)
+def update_restaurant_position(sender, instance, **kwargs):
+    address = instance.address
+
+    def update_position():
+        # geocoded after commit, so no transaction waits for the geocoder
+        fetch_coordinates([address])
+        invalidate_restaurant_index_version()
+
+    transaction.on_commit(update_position)
+
+
+@receiver(post_delete, sender=Restaurant)
+def remove_restaurant_position(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_restaurant_index_version)
+
+
+@receiver(post_save, sender=Order)
+def geocode_order_address(sender, instance, update_fields=None, **kwargs):
+    # the manager pages only read stored coordinates, so the address is
+    # geocoded once, after the order is committed
+    if update_fields is not None and 'address' not in update_fields:
+        return
+    address = instance.address
+    transaction.on_commit(lambda: fetch_coordinates([address]))
@@ -0,0 +1,204 @@
+import heapq
+from collections import defaultdict
+from math import asin, cos, floor, radians, sin
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from foodcartapp.models import Restaurant
+
+from .coordinates import EARTH_RADIUS_KM, calculate_distance, fetch_coordinates
+
+RESTAURANT_INDEX_VERSION_KEY = 'places:restaurant-index:version'
+DEFAULT_CELL_SIZE = 0.05
+
+
+class GridIndex:
+    """Spatial index bucketing points into a regular lat/lon grid.
+
+    The nearest points are searched ring by ring around the query cell.
+    The search stops as soon as no point outside the visited cells can be
+    closer than the k-th point found so far, so only a handful of cells are
+    visited for a city-sized grid.
+    """
+
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = defaultdict(dict)
+        self.points = {}
+        self.max_abs_lat = 0
+
+    def __len__(self):
+        return len(self.points)
+
+    def __contains__(self, key):
+        return key in self.points
+
+    def get_cell(self, point):
+        lat, lon = point
+        return floor(lat / self.cell_size), floor(lon / self.cell_size)
+
+    def add(self, key, point):
+        if key in self.points:
+            self.remove(key)
+        self.points[key] = point
+        self.cells[self.get_cell(point)][key] = point
+        self.max_abs_lat = max(self.max_abs_lat, abs(point[0]))
+
+    def remove(self, key):
+        point = self.points.pop(key, None)
+        if point is None:
+            return
+        cell = self.get_cell(point)
+        del self.cells[cell][key]
+        if not self.cells[cell]:
+            del self.cells[cell]
+
+    def get_cell_bounds(self):
+        rows = [row for row, column in self.cells]
+        columns = [column for row, column in self.cells]
+        return min(rows), max(rows), min(columns), max(columns)
+
+    def iter_ring(self, center, radius):
+        row, column = center
+        if radius == 0:
+            yield center
+            return
+        for column_offset in range(-radius, radius + 1):
+            yield row - radius, column + column_offset
+            yield row + radius, column + column_offset
+        for row_offset in range(-radius + 1, radius):
+            yield row + row_offset, column - radius
+            yield row + row_offset, column + radius
+
+    def get_outside_distance(self, point, center, radius):
+        """Lower bound of the distance to any point beyond the visited rings."""
+        lat, lon = point
+        row, column = center
+        lat_gap = min(
+            lat - (row - radius) * self.cell_size,
+            (row + radius + 1) * self.cell_size - lat,
+        )
+        lon_gap = min(
+            lon - (column - radius) * self.cell_size,
+            (column + radius + 1) * self.cell_size - lon,
+        )
+        max_lat = radians(min(90, max(abs(lat), self.max_abs_lat)))
+        lat_distance = EARTH_RADIUS_KM * radians(lat_gap)
+        lon_distance = 2 * EARTH_RADIUS_KM * asin(
+            min(1, cos(max_lat) * sin(radians(lon_gap) / 2))
+        )
+        return min(lat_distance, lon_distance)
+
+    def nearest(self, point, k=1, predicate=None):
+        """Return up to k (key, distance in km) pairs, nearest first.
+
+        Only keys accepted by the predicate are considered.
+        """
+        if not self.points or k <= 0:
+            return []
+
+        center = self.get_cell(point)
+        min_row, max_row, min_column, max_column = self.get_cell_bounds()
+        max_radius = max(
+            abs(center[0] - min_row), abs(center[0] - max_row),
+            abs(center[1] - min_column), abs(center[1] - max_column),
+        )
+
+        found = []
+
+        def visit(cells):
+            for cell in cells:
+                for key, key_point in self.cells.get(cell, {}).items():
+                    if predicate is not None and not predicate(key):
+                        continue
+                    distance = calculate_distance(point, key_point)
+                    if len(found) < k:
+                        heapq.heappush(found, (-distance, key))
+                    elif distance < -found[0][0]:
+                        heapq.heapreplace(found, (-distance, key))
+
+        for radius in range(max_radius + 1):
+            if 8 * radius > len(self.cells):
+                # Rings are now larger than the set of occupied cells,
+                # so scanning the remaining occupied cells is cheaper.
+                visit([
+                    cell for cell in self.cells
+                    if max(abs(cell[0] - center[0]), abs(cell[1] - center[1])) >= radius
+                ])
+                break
+            visit(self.iter_ring(center, radius))
+            if len(found) == k and -found[0][0] <= self.get_outside_distance(point, center, radius):
+                break
+
+        return [(key, -distance) for distance, key in sorted(found, reverse=True)]
+
+
+class RestaurantIndex:
+    """Process-wide grid index over restaurant coordinates.
+
+    The grid is rebuilt on the next lookup once the restaurant index
+    version changes. A restaurant saved or deleted in this process clears
+    the cached version after commit, other processes see the change when
+    their cached version expires.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.grid = None
+        self.version = None
+
+    def refresh(self):
+        version = get_restaurant_index_version()
+        if self.grid is None or version != self.version:
+            self.grid = build_restaurant_grid()
+            self.version = version
+
+    def nearest(self, point, k=1, restaurant_ids=None):
+        """Return up to k (restaurant id, distance) pairs, nearest first.
+
+        When restaurant_ids is given, e.g. the restaurants stocking every
+        product of an order, other restaurants are skipped.
+        """
+        predicate = None
+        if restaurant_ids is not None:
+            predicate = restaurant_ids.__contains__
+        with self.lock:
+            self.refresh()
+            return self.grid.nearest(point, k, predicate)
+
+
+def get_restaurant_index_version():
+    """Return a token which changes whenever a restaurant is added, changed or deleted.
+
+    It is read from the database and cached for RESTAURANT_INDEX_VERSION_TTL,
+    as the catalogue version is, so processes which do not share the cache
+    notice changes made by the others.
+    """
+    version = cache.get(RESTAURANT_INDEX_VERSION_KEY)
+    if version is None:
+        state = Restaurant.objects.aggregate(count=Count('id'), updated_at=Max('updated_at'))
+        updated_at = state['updated_at'].isoformat() if state['updated_at'] else ''
+        version = f'{state["count"]}-{updated_at}'
+        cache.set(RESTAURANT_INDEX_VERSION_KEY, version, settings.RESTAURANT_INDEX_VERSION_TTL)
+    return version
+
+
+def invalidate_restaurant_index_version():
+    cache.delete(RESTAURANT_INDEX_VERSION_KEY)
+
+
+def build_restaurant_grid():
+    restaurants = list(Restaurant.objects.values_list('id', 'address'))
+    coordinates = fetch_coordinates(address for _, address in restaurants)
+    grid = GridIndex()
+    for restaurant_id, address in restaurants:
+        point = coordinates.get(address)
+        if point:
+            grid.add(restaurant_id, point)
+    return grid
+
+
+restaurant_index = RestaurantIndex()
@@ -0,0 +1,254 @@
+import io
+import json
+import os
+import random
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from urllib.error import URLError
+from urllib.parse import parse_qs, urlparse
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from foodcartapp.models import Order, Restaurant
+
+from .coordinates import (calculate_distance, fetch_coordinates,
+                          get_stored_coordinates)
+from .geocoders import FileGeocoder, YandexGeocoder
+from .models import Place
+from .spatial import (RESTAURANT_INDEX_VERSION_KEY, GridIndex,
+                      restaurant_index)
+
+KNOWN_COORDINATES = {
+    'Москва, Красная площадь, 1': [55.7539, 37.6208],
+    'Москва, Тверская улица, 13': [55.7616, 37.6094],
+}
+
+
+class GeocoderFileMixin:
+    def setUp(self):
+        geocoder_file = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+        with geocoder_file:
+            json.dump(KNOWN_COORDINATES, geocoder_file, ensure_ascii=False)
+        self.addCleanup(os.remove, geocoder_file.name)
+        settings_override = override_settings(GEOCODER_FILE=geocoder_file.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class FetchCoordinatesTest(GeocoderFileMixin, TestCase):
+    def test_geocodes_each_address_once(self):
+        addresses = list(KNOWN_COORDINATES) + ['Нигде']
+        with mock.patch.object(FileGeocoder, 'geocode', wraps=FileGeocoder().geocode) as geocode:
+            first_coordinates = fetch_coordinates(addresses * 2)
+            second_coordinates = fetch_coordinates(addresses)
+
+        self.assertEqual(geocode.call_count, 1)
+        self.assertEqual(first_coordinates, second_coordinates)
+        self.assertEqual(first_coordinates['Москва, Красная площадь, 1'], (55.7539, 37.6208))
+        self.assertIsNone(first_coordinates['Нигде'])
+        self.assertEqual(Place.objects.count(), 3)
+
+    @override_settings(GEOCODER_MISS_CACHE_TTL=60)
+    def test_refreshes_expired_misses(self):
+        Place.objects.create(
+            address='Москва, Красная площадь, 1',
+            updated_at=timezone.now() - timedelta(minutes=2),
+        )
+        Place.objects.create(address='Нигде', updated_at=timezone.now())
+
+        with mock.patch.object(FileGeocoder, 'geocode', wraps=FileGeocoder().geocode) as geocode:
+            coordinates = fetch_coordinates(['Москва, Красная площадь, 1', 'Нигде'])
+
+        geocode.assert_called_once_with({'Москва, Красная площадь, 1'})
+        self.assertEqual(coordinates['Москва, Красная площадь, 1'], (55.7539, 37.6208))
+        self.assertIsNone(coordinates['Нигде'])
+
+    def test_failed_geocoding_is_not_stored(self):
+        with mock.patch.object(FileGeocoder, 'geocode', return_value={}):
+            coordinates = fetch_coordinates(['Москва, Красная площадь, 1'])
+
+        self.assertEqual(coordinates, {'Москва, Красная площадь, 1': None})
+        self.assertFalse(Place.objects.exists())
+
+    def test_order_address_is_geocoded_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(
+                firstname='Иван',
+                lastname='Петров',
+                phonenumber='+79123456789',
+                address='Москва, Красная площадь, 1',
+            )
+            self.assertFalse(Place.objects.exists())
+
+        self.assertEqual(
+            get_stored_coordinates(['Москва, Красная площадь, 1', 'Нигде']),
+            {'Москва, Красная площадь, 1': (55.7539, 37.6208), 'Нигде': None},
+        )
+
+    @override_settings(GEOCODER_CACHE_TTL=60)
+    def test_keeps_expired_place_when_geocoder_fails(self):
+        Place.objects.create(
+            address='Нигде',
+            lat=1,
+            lon=2,
+            updated_at=timezone.now() - timedelta(minutes=2),
+        )
+
+        with mock.patch.object(FileGeocoder, 'geocode', return_value={}):
+            coordinates = fetch_coordinates(['Нигде'])
+
+        self.assertEqual(coordinates['Нигде'], (1, 2))
+
+    @override_settings(GEOCODER_CACHE_TTL=60)
+    def test_refreshes_expired_places(self):
+        Place.objects.create(
+            address='Москва, Красная площадь, 1',
+            lat=0,
+            lon=0,
+            updated_at=timezone.now() - timedelta(minutes=2),
+        )
+
+        coordinates = fetch_coordinates(['Москва, Красная площадь, 1'])
+
+        self.assertEqual(coordinates['Москва, Красная площадь, 1'], (55.7539, 37.6208))
+        self.assertEqual(Place.objects.get().lat, 55.7539)
+
+
+class RestaurantIndexTest(GeocoderFileMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_restaurant_is_geocoded_and_indexed_after_commit(self):
+        geocoder = FileGeocoder()
+        with mock.patch.object(FileGeocoder, 'geocode', wraps=geocoder.geocode) as geocode:
+            with self.captureOnCommitCallbacks(execute=True):
+                restaurant = Restaurant.objects.create(
+                    name='Star Burger', address='Москва, Тверская улица, 13',
+                )
+                geocode.assert_not_called()
+
+        geocode.assert_called_once()
+        nearest = restaurant_index.nearest(KNOWN_COORDINATES['Москва, Красная площадь, 1'])
+        self.assertEqual([restaurant_id for restaurant_id, _ in nearest], [restaurant.id])
+
+    def test_deleted_restaurant_is_removed_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            restaurant = Restaurant.objects.create(
+                name='Star Burger', address='Москва, Тверская улица, 13',
+            )
+        point = KNOWN_COORDINATES['Москва, Красная площадь, 1']
+        self.assertEqual(len(restaurant_index.nearest(point)), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            restaurant.delete()
+
+        self.assertEqual(restaurant_index.nearest(point), [])
+
+
+    @override_settings(RESTAURANT_INDEX_VERSION_TTL=60)
+    def test_restaurant_added_by_another_process_is_seen_after_expiry(self):
+        point = KNOWN_COORDINATES['Москва, Красная площадь, 1']
+        self.assertEqual(restaurant_index.nearest(point), [])
+
+        # on_commit callbacks of another process never run in this one
+        restaurant = Restaurant.objects.create(name='Star Burger', address='Москва, Тверская улица, 13')
+        self.assertEqual(restaurant_index.nearest(point), [])
+
+        cache.delete(RESTAURANT_INDEX_VERSION_KEY)
+        nearest = restaurant_index.nearest(point)
+
+        self.assertEqual([restaurant_id for restaurant_id, _ in nearest], [restaurant.id])
+
+@override_settings(YANDEX_GEOCODER_API_KEY='secret', GEOCODER_TIMEOUT=1)
+class YandexGeocoderTest(TestCase):
+    def build_answer(self, *positions):
+        answer = {'response': {'GeoObjectCollection': {'featureMember': [
+            {'GeoObject': {'Point': {'pos': position}}} for position in positions
+        ]}}}
+        return io.BytesIO(json.dumps(answer).encode('utf-8'))
+
+    def test_geocodes_found_addresses(self):
+        answers = {
+            'Москва, Красная площадь, 1': self.build_answer('37.6208 55.7539'),
+            'Нигде': self.build_answer(),
+        }
+
+        def urlopen(url, timeout):
+            query = parse_qs(urlparse(url).query)
+            self.assertEqual(query['apikey'], ['secret'])
+            self.assertEqual(timeout, 1)
+            return answers[query['geocode'][0]]
+
+        with mock.patch('places.geocoders.urlopen', urlopen):
+            coordinates = YandexGeocoder().geocode(answers)
+
+        self.assertEqual(coordinates, {
+            'Москва, Красная площадь, 1': (55.7539, 37.6208),
+            'Нигде': None,
+        })
+
+    def test_failed_request_is_skipped(self):
+        with mock.patch('places.geocoders.urlopen', side_effect=URLError('timed out')):
+            coordinates = YandexGeocoder().geocode(['Москва, Красная площадь, 1'])
+
+        self.assertEqual(coordinates, {})
+
+    @override_settings(YANDEX_GEOCODER_API_KEY='')
+    def test_requires_api_key(self):
+        with self.assertRaises(ImproperlyConfigured):
+            YandexGeocoder()
+
+
+class CalculateDistanceTest(TestCase):
+    def test_distance_between_known_points(self):
+        distance = calculate_distance(
+            KNOWN_COORDINATES['Москва, Красная площадь, 1'],
+            KNOWN_COORDINATES['Москва, Тверская улица, 13'],
+        )
+
+        self.assertAlmostEqual(distance, 1.15, places=1)
+
+
+class GridIndexTest(TestCase):
+    def setUp(self):
+        random.seed(0)
+        self.points = {
+            key: (random.uniform(55.5, 56), random.uniform(37.3, 37.9))
+            for key in range(300)
+        }
+        self.grid = GridIndex()
+        for key, point in self.points.items():
+            self.grid.add(key, point)
+
+    def find_nearest_by_scan(self, point, k, keys):
+        distances = sorted(
+            (calculate_distance(point, self.points[key]), key) for key in keys
+        )
+        return [key for _, key in distances[:k]]
+
+    def test_matches_full_scan(self):
+        allowed_keys = set(range(0, 300, 3))
+        for _ in range(50):
+            point = (random.uniform(55.4, 56.1), random.uniform(37.2, 38))
+
+            nearest = self.grid.nearest(point, 5, allowed_keys.__contains__)
+
+            self.assertEqual(
+                [key for key, _ in nearest],
+                self.find_nearest_by_scan(point, 5, allowed_keys),
+            )
+
+    def test_moved_and_removed_points(self):
+        self.grid.add(1, (10, 10))
+        self.grid.remove(2)
+
+        nearest = self.grid.nearest((10, 10), 2)
+
+        self.assertEqual(nearest[0], (1, 0))
+        self.assertEqual(len(self.grid), 299)
+        self.assertNotIn(2, self.grid)
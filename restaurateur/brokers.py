@@ -0,0 +1,115 @@
+import itertools
+from collections import deque
+from datetime import timedelta
+from functools import lru_cache
+from threading import Lock
+
+from django.conf import settings
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import FeedEvent
+
+
+class BaseBroker:
+    """Interface of the pub/sub broker behind the manager order feed.
+
+    Every published event gets an increasing id. Listeners pass the id of
+    the last event they have seen and get everything published after it.
+    """
+
+    def publish(self, event):
+        raise NotImplementedError
+
+    def get_last_event_id(self):
+        raise NotImplementedError
+
+    def listen(self, after):
+        """Return events newer than `after` without waiting for new ones.
+
+        Return (last event id, events, is_complete). is_complete is False
+        when some events after `after` were already dropped, so the
+        listener has to reload the whole state. Events may be repeated,
+        listeners must handle them idempotently.
+        """
+        raise NotImplementedError
+
+
+class InMemoryBroker(BaseBroker):
+    """Broker keeping recent events in process memory.
+
+    Suits a single-process deployment and tests only: events published
+    in one process are not seen by listeners served by another one.
+    """
+
+    def __init__(self, max_events=1000):
+        self.events = deque(maxlen=max_events)
+        self.event_ids = itertools.count(1)
+        self.last_event_id = 0
+        self.lock = Lock()
+
+    def publish(self, event):
+        with self.lock:
+            self.last_event_id = next(self.event_ids)
+            self.events.append((self.last_event_id, event))
+
+    def get_last_event_id(self):
+        return self.last_event_id
+
+    def listen(self, after):
+        with self.lock:
+            if after > self.last_event_id:
+                # The listener saw events of a previous broker instance
+                return self.last_event_id, [], False
+            events = [event for event_id, event in self.events if event_id > after]
+            oldest_event_id = self.events[0][0] if self.events else self.last_event_id + 1
+            return self.last_event_id, events, after >= oldest_event_id - 1
+
+
+class DatabaseBroker(BaseBroker):
+    """Broker keeping events in a database table shared by all processes.
+
+    Event ids come from a sequence, so a transaction which took an id
+    may commit after a later one. Events of the last `replay_window` are
+    therefore returned again to listeners which are already past them.
+    Events older than `max_age` are deleted from time to time.
+    """
+    PRUNE_EVERY = 100
+
+    def __init__(self, max_age=timedelta(hours=1), replay_window=timedelta(seconds=10)):
+        self.max_age = max_age
+        self.replay_window = replay_window
+
+    def publish(self, event):
+        feed_event = FeedEvent.objects.create(payload=event)
+        if feed_event.id % self.PRUNE_EVERY == 0:
+            FeedEvent.objects.filter(created_at__lt=timezone.now() - self.max_age).delete()
+
+    def get_last_event_id(self):
+        return FeedEvent.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+    def listen(self, after):
+        event_ids = FeedEvent.objects.aggregate(first_id=Min('id'), last_id=Max('id'))
+        last_event_id = event_ids['last_id'] or 0
+        if after > last_event_id:
+            return last_event_id, [], False
+        if event_ids['first_id'] is not None and after < event_ids['first_id'] - 1:
+            return last_event_id, [], False
+
+        feed_events = (
+            FeedEvent.objects
+            .filter(Q(id__gt=after) | Q(created_at__gte=timezone.now() - self.replay_window))
+            .order_by('id')
+            .values_list('id', 'payload')
+        )
+        events = []
+        for event_id, payload in feed_events:
+            last_event_id = max(last_event_id, event_id)
+            events.append(payload)
+        return last_event_id, events, True
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.ORDER_FEED_BROKER)()
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.15 on 2026-10-18 19:27
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='событие')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='создано')),
+            ],
+            options={
+                'verbose_name': 'событие ленты заказов',
+                'verbose_name_plural': 'события ленты заказов',
+            },
+        ),
+    ]
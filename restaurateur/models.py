@@ -1,3 +1,14 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
-# Create your models here.
+
+class FeedEvent(models.Model):
+    payload = models.JSONField('событие', encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField('создано', auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'событие ленты заказов'
+        verbose_name_plural = 'события ленты заказов'
+
+    def __str__(self):
+        return f'Feed event {self.id}'
@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from foodcartapp.models import Order
+
+from .brokers import get_broker
+
+
+@receiver(post_save, sender=Order)
+def publish_order_change(sender, instance, created, **kwargs):
+    event = {'order_id': instance.id, 'created': created}
+    transaction.on_commit(lambda: get_broker().publish(event))
@@ -1,3 +1,352 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+
+from foodcartapp.models import (Order, OrderItem, Product, Restaurant,
+                                RestaurantMenuItem)
+from places.models import Place
+
+from .brokers import DatabaseBroker, InMemoryBroker
+from .models import FeedEvent
+from .views import OrderFilter, encode_cursor, filter_orders
+
+
+class BrokerTestMixin:
+    def test_listen_returns_events_after_id(self):
+        self.broker.publish({'order_id': 1})
+        self.broker.publish({'order_id': 2})
+        first_event_id = self.broker.get_last_event_id() - 1
+
+        last_event_id, events, is_complete = self.broker.listen(first_event_id)
+
+        self.assertEqual(last_event_id, self.broker.get_last_event_id())
+        self.assertEqual(events, [{'order_id': 2}])
+        self.assertTrue(is_complete)
+
+    def test_listen_without_new_events(self):
+        self.broker.publish({'order_id': 1})
+        last_event_id = self.broker.get_last_event_id()
+
+        self.assertEqual(self.broker.listen(last_event_id), (last_event_id, [], True))
+
+    def test_listen_ahead_of_broker_is_incomplete(self):
+        self.broker.publish({'order_id': 1})
+        last_event_id = self.broker.get_last_event_id()
+
+        self.assertEqual(self.broker.listen(last_event_id + 10), (last_event_id, [], False))
+
+
+class InMemoryBrokerTest(BrokerTestMixin, TestCase):
+    def setUp(self):
+        self.broker = InMemoryBroker(max_events=2)
+
+    def test_listen_after_dropped_events_is_incomplete(self):
+        for order_id in range(3):
+            self.broker.publish({'order_id': order_id})
+
+        _, _, is_complete = self.broker.listen(0)
+
+        self.assertFalse(is_complete)
+
+
+class DatabaseBrokerTest(BrokerTestMixin, TestCase):
+    def setUp(self):
+        self.broker = DatabaseBroker(replay_window=timedelta(0))
+
+    def test_listen_after_pruned_events_is_incomplete(self):
+        for order_id in range(3):
+            self.broker.publish({'order_id': order_id})
+        FeedEvent.objects.order_by('id').first().delete()
+
+        _, _, is_complete = self.broker.listen(0)
+
+        self.assertFalse(is_complete)
+
+    def test_recent_events_are_replayed(self):
+        broker = DatabaseBroker(replay_window=timedelta(minutes=1))
+        broker.publish({'order_id': 1})
+
+        _, events, _ = broker.listen(broker.get_last_event_id())
+
+        self.assertEqual(events, [{'order_id': 1}])
+
+
+class OrdersFeedTest(TestCase):
+    def setUp(self):
+        manager = User.objects.create_user('manager', password='secret', is_staff=True)
+        self.client.force_login(manager)
+        self.last_event_id = DatabaseBroker().get_last_event_id()
+
+    def create_order(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Order.objects.create(
+                firstname='Иван',
+                lastname='Петров',
+                phonenumber='+79123456789',
+                address='Москва, Красная площадь, 1',
+                **fields,
+            )
+
+    def get_feed(self, **params):
+        response = self.client.get('/manager/orders/feed/', {'after': self.last_event_id, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_new_order_is_rendered(self):
+        order = self.create_order()
+
+        feed = self.get_feed()
+
+        self.assertFalse(feed['reset'])
+        self.assertEqual([row['id'] for row in feed['orders']], [order.id])
+        self.assertIn(f'data-order-id="{order.id}"', feed['orders'][0]['html'])
+
+    def test_order_not_matching_filters_has_no_html(self):
+        order = self.create_order(status=Order.RECEIVED)
+
+        feed = self.get_feed(status=Order.ACCEPTED)
+
+        self.assertEqual(feed['orders'], [{'id': order.id, 'html': None}])
+
+    def test_feed_ahead_of_broker_is_reset(self):
+        feed = self.get_feed(after=self.last_event_id + 10)
+
+        self.assertTrue(feed['reset'])
+
+
+class ProductsAvailabilityTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        manager = User.objects.create_user('manager', password='secret', is_staff=True)
+        self.client.force_login(manager)
+        self.burger = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        self.restaurants = [
+            Restaurant.objects.create(name=name) for name in ['Б', 'А']
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menu_item = RestaurantMenuItem.objects.create(
+                restaurant=self.restaurants[0],
+                product=self.burger,
+            )
+
+    def get_availability(self):
+        response = self.client.get('/manager/products/availability/')
+        self.assertEqual(response.status_code, 200)
+        matrix = response.json()
+        availability = int(matrix['products'][0]['availability'], 16)
+        return {
+            restaurant['name']: bool(availability >> restaurant['bit'] & 1)
+            for restaurant in matrix['restaurants']
+        }
+
+    def test_restaurants_are_ordered_by_name(self):
+        self.assertEqual(list(self.get_availability()), ['А', 'Б'])
+
+    def test_menu_item_change_is_applied_after_commit(self):
+        self.assertEqual(self.get_availability(), {'А': False, 'Б': True})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menu_item.availability = False
+            self.menu_item.save()
+            RestaurantMenuItem.objects.create(
+                restaurant=self.restaurants[1],
+                product=self.burger,
+            )
+
+        self.assertEqual(self.get_availability(), {'А': True, 'Б': False})
+
+    def test_deleted_restaurant_is_dropped(self):
+        self.get_availability()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restaurants[0].delete()
+
+        self.assertEqual(self.get_availability(), {'А': False})
+
+    def test_products_page_is_rendered(self):
+        response = self.client.get('/manager/products/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Бургер')
+
+    def test_product_without_image(self):
+        Product.objects.create(name='Картошка', price=50)
+
+        response = self.client.get('/manager/products/availability/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([product['image'] for product in response.json()['products']], ['/media/burger.jpg', None])
+
+    def test_products_page_renders_product_without_image(self):
+        # products created by the menu import have no image
+        Product.objects.create(name='Картошка', price=50)
+
+        response = self.client.get('/manager/products/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Картошка')
+
+
+class OrdersPageTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        manager = User.objects.create_user('manager', password='secret', is_staff=True)
+        self.client.force_login(manager)
+        Place.objects.bulk_create([
+            Place(address='Москва, Тверская, 1', lat=55.757, lon=37.613, updated_at=timezone.now()),
+            Place(address='Москва, Красная площадь, 1', lat=55.754, lon=37.620, updated_at=timezone.now()),
+        ])
+        restaurant = Restaurant.objects.create(name='Star Burger', address='Москва, Тверская, 1')
+        self.burger = Product.objects.create(name='Бургер', price=100)
+        RestaurantMenuItem.objects.create(restaurant=restaurant, product=self.burger)
+
+    def create_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(
+                firstname='Иван',
+                lastname='Петров',
+                phonenumber='+79123456789',
+                address='Москва, Красная площадь, 1',
+            )
+            OrderItem.objects.create(order=order, product=self.burger, quantity=2, price=100)
+
+    def test_query_count_does_not_depend_on_orders_count(self):
+        self.create_orders(1)
+        # fill the restaurant index
+        self.client.get('/manager/orders/')
+
+        # session, user, feed cursor, orders, items, restaurants, menu,
+        # coordinates and restaurants of the filter form
+        with self.assertNumQueries(9):
+            self.client.get('/manager/orders/')
+
+        self.create_orders(9)
+        with self.assertNumQueries(9):
+            response = self.client.get('/manager/orders/')
+
+        orders = response.context['orders']
+        self.assertEqual(len(orders), 10)
+        self.assertEqual(orders[0].total_price, 200)
+        restaurant, distance = orders[0].available_restaurants[0]
+        self.assertEqual(restaurant.name, 'Star Burger')
+        self.assertIsNotNone(distance)
+
+
+class RestaurantsPageTest(TestCase):
+    def setUp(self):
+        manager = User.objects.create_user('manager', password='secret', is_staff=True)
+        self.client.force_login(manager)
+        self.products = [
+            Product.objects.create(name=f'Бургер {number}', price=100) for number in range(3)
+        ]
+
+    def create_restaurants(self, count):
+        for _ in range(count):
+            restaurant = Restaurant.objects.create(name='Star Burger')
+            RestaurantMenuItem.objects.bulk_create([
+                RestaurantMenuItem(restaurant=restaurant, product=product, availability=available)
+                for product, available in zip(self.products, [True, True, False])
+            ])
+            Order.objects.create(
+                firstname='Иван',
+                lastname='Петров',
+                phonenumber='+79123456789',
+                address='Москва, Красная площадь, 1',
+                status=Order.ACCEPTED,
+                restaurant=restaurant,
+            )
+
+    def test_query_count_does_not_depend_on_restaurants_count(self):
+        self.create_restaurants(1)
+
+        # session, user and restaurants with their counts
+        with self.assertNumQueries(3):
+            self.client.get('/manager/restaurants/')
+
+        self.create_restaurants(9)
+        with self.assertNumQueries(3):
+            response = self.client.get('/manager/restaurants/')
+
+        restaurants = response.context['restaurants']
+        self.assertEqual(len(restaurants), 10)
+        for restaurant in restaurants:
+            self.assertEqual(restaurant.available_items_count, 2)
+            self.assertEqual(restaurant.unavailable_items_count, 1)
+            self.assertEqual(restaurant.open_orders_count, 1)
+
+
+class OrderFilterTest(TestCase):
+    def setUp(self):
+        manager = User.objects.create_user('manager', password='secret', is_staff=True)
+        self.client.force_login(manager)
+        self.restaurant = Restaurant.objects.create(name='Star Burger')
+        self.orders = [
+            self.create_order(status=status, payment_method=payment_method)
+            for status, payment_method in [
+                (Order.ACCEPTED, Order.ELECTRONIC),
+                (Order.RECEIVED, Order.ELECTRONIC),
+                (Order.IN_PROCESS, Order.CASH),
+                (Order.IN_DELIVERY, Order.ELECTRONIC),
+                (Order.ACCEPTED, Order.CASH),
+            ]
+        ]
+        self.orders[2].restaurant = self.restaurant
+        self.orders[2].save()
+        # equal creation times, so only the id orders the queue
+        Order.objects.update(created_at=timezone.now())
+
+    def create_order(self, **fields):
+        return Order.objects.create(
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79123456789',
+            address='Москва, Красная площадь, 1',
+            **fields,
+        )
+
+    def get_filtered_numbers(self, data):
+        order_filter = OrderFilter(data)
+        order_filter.is_valid()
+        orders = filter_orders(Order.objects.all(), order_filter.cleaned_data)
+        order_ids = [order.id for order in self.orders]
+        return [order_ids.index(order.id) for order in orders]
+
+    def test_default_statuses_exclude_received(self):
+        self.assertEqual(self.get_filtered_numbers({}), [0, 2, 3, 4])
+
+    def test_filters(self):
+        filters = [
+            ({'status': [Order.RECEIVED]}, [1]),
+            ({'status': [Order.ACCEPTED, Order.RECEIVED]}, [0, 1, 4]),
+            ({'payment_method': Order.CASH}, [2, 4]),
+            ({'restaurant': self.restaurant.id}, [2]),
+            ({'cursor': encode_cursor(Order.objects.get(pk=self.orders[2].pk))}, [3, 4]),
+        ]
+        for data, order_numbers in filters:
+            with self.subTest(**data):
+                self.assertEqual(self.get_filtered_numbers(data), order_numbers)
+
+    def test_malformed_cursor_is_ignored(self):
+        for cursor in ['garbage', encode_cursor(self.orders[0])[:-2] + '!!', 'MjAyNC0wMS0wMQ']:
+            with self.subTest(cursor=cursor):
+                order_filter = OrderFilter({'cursor': cursor})
+
+                self.assertFalse(order_filter.is_valid())
+                self.assertIn('cursor', order_filter.errors)
+                self.assertEqual(self.get_filtered_numbers({'cursor': cursor}), [0, 2, 3, 4])
+
+    def test_pages_follow_each_other(self):
+        order_ids = []
+        query = ''
+        with mock.patch('restaurateur.views.ORDERS_PER_PAGE', 2):
+            while query is not None:
+                response = self.client.get(f'/manager/orders/{query}')
+                self.assertEqual(response.status_code, 200)
+                order_ids += [order.id for order in response.context['orders']]
+                query = response.context['next_page_url']
 
-# Create your tests here.
+        self.assertEqual(order_ids, [self.orders[number].id for number in [0, 2, 3, 4]])
@@ -9,11 +9,14 @@ urlpatterns = [
     path('', lambda request: redirect('restaurateur:ProductsView')),
 
     path('products/', views.view_products, name="ProductsView"),
+    path('products/availability/', views.products_availability_api, name="products_availability"),
 
     path('restaurants/', views.view_restaurants, name="RestaurantView"),
+    path('restaurants/<int:restaurant_id>/products/', views.restaurant_products_api, name="restaurant_products"),
 
     # TODO заглушка для нереализованного функционала
     path('orders/', views.view_orders, name="view_orders"),
+    path('orders/feed/', views.orders_feed, name="orders_feed"),
 
     path('login/', views.LoginView.as_view(), name="login"),
     path('logout/', views.LogoutView.as_view(), name="logout"),
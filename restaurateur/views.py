@@ -1,12 +1,32 @@
+from datetime import datetime
+
 from django import forms
+from django.conf import settings
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
 from django.contrib.auth.decorators import user_passes_test
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse_lazy
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 from django.views import View
 
-from foodcartapp.models import Order, Product, Restaurant
+from foodcartapp.availability import (availability_matrix,
+                                      get_eligible_restaurant_ids,
+                                      get_restaurants_by_product,
+                                      unpack_availability)
+from foodcartapp.models import Order, Product, Restaurant, RestaurantMenuItem
+from places.coordinates import get_stored_coordinates
+from places.spatial import restaurant_index
+from star_burger.db import use_replica
+
+from .brokers import get_broker
+
+NEAREST_RESTAURANTS_COUNT = 5
+ORDERS_PER_PAGE = 50
 
 
 class Login(forms.Form):
@@ -26,6 +46,59 @@ class Login(forms.Form):
     )
 
 
+class OrderFilter(forms.Form):
+    status = forms.MultipleChoiceField(
+        label='Статус', required=False, choices=Order.STATUSES,
+        widget=forms.SelectMultiple(attrs={'class': 'form-control'})
+    )
+    payment_method = forms.ChoiceField(
+        label='Метод оплаты', required=False,
+        choices=[('', 'Любой')] + Order.PAYMENT_METHODS,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    restaurant = forms.ModelChoiceField(
+        label='Ресторан', required=False, empty_label='Любой',
+        queryset=Restaurant.objects.order_by('name'),
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    cursor = forms.CharField(required=False, widget=forms.HiddenInput)
+
+    def clean_cursor(self):
+        cursor = self.cleaned_data['cursor']
+        if not cursor:
+            return None
+        try:
+            created_at, order_id = urlsafe_base64_decode(cursor).decode().split('|')
+            return datetime.fromisoformat(created_at), int(order_id)
+        except ValueError:
+            raise forms.ValidationError('Неверный курсор')
+
+
+def encode_cursor(order):
+    return urlsafe_base64_encode(f'{order.created_at.isoformat()}|{order.id}'.encode())
+
+
+def filter_orders(orders, filters):
+    """Apply the manager queue filters and the keyset cursor to orders.
+
+    Orders go oldest first by (created_at, id), so the page after the cursor
+    is fetched through the index without OFFSET.
+    """
+    orders = orders.filter(
+        status__in=filters.get('status') or Order.UNPROCESSED_STATUSES
+    )
+    if filters.get('payment_method'):
+        orders = orders.filter(payment_method=filters['payment_method'])
+    if filters.get('restaurant'):
+        orders = orders.filter(restaurant=filters['restaurant'])
+    if filters.get('cursor'):
+        created_at, order_id = filters['cursor']
+        orders = orders.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=order_id)
+        )
+    return orders.order_by('created_at', 'id')
+
+
 class LoginView(View):
     def get(self, request, *args, **kwargs):
         form = Login()
@@ -61,21 +134,34 @@ def is_manager(user):
     return user.is_staff  # FIXME replace with specific permission
 
 
+def get_products_with_availability():
+    matrix = availability_matrix.get()
+    restaurants = Restaurant.objects.filter(
+        id__in=matrix['restaurant_ids'],
+    ).order_by('name')
+    positions = {
+        restaurant_id: position
+        for position, restaurant_id in enumerate(matrix['restaurant_ids'])
+    }
+    restaurant_positions = [positions[restaurant.id] for restaurant in restaurants]
+    products = Product.objects.select_related('category').order_by('id')
+    products_with_availability = [
+        (product, matrix['rows'].get(product.id, 0)) for product in products
+    ]
+    return restaurants, restaurant_positions, products_with_availability
+
+
 @user_passes_test(is_manager, login_url='restaurateur:login')
+@use_replica()
 def view_products(request):
-    restaurants = list(Restaurant.objects.order_by('name'))
-    products = list(Product.objects.prefetch_related('menu_items'))
-
-    products_with_restaurant_availability = []
-    for product in products:
-        availability = {
-            item.restaurant_id: item.availability for item in product.menu_items.all()}
-        ordered_availability = [availability.get(
-            restaurant.id, False) for restaurant in restaurants]
-
-        products_with_restaurant_availability.append(
-            (product, ordered_availability)
-        )
+    restaurants, restaurant_positions, products_with_availability = (
+        get_products_with_availability()
+    )
+
+    products_with_restaurant_availability = [
+        (product, unpack_availability(availability, restaurant_positions))
+        for product, availability in products_with_availability
+    ]
 
     return render(request, template_name="products_list.html", context={
         'products_with_restaurant_availability': products_with_restaurant_availability,
@@ -84,36 +170,198 @@ def view_products(request):
 
 
 @user_passes_test(is_manager, login_url='restaurateur:login')
-def view_restaurants(request):
-    restaurants = Restaurant.objects.prefetch_related('menu_items__product').all()
+@use_replica()
+def products_availability_api(request):
+    """Return the availability matrix for client-side rendering.
 
-    for restaurant in restaurants:
-        restaurant.available_products = [
-            menu_item.product for menu_item in restaurant.menu_items.all() if menu_item.availability
-        ]
+    `availability` of a product is a hex bitset: bit N is set when
+    the restaurant with `bit` N sells the product.
+    """
+    restaurants, restaurant_positions, products_with_availability = (
+        get_products_with_availability()
+    )
+
+    return JsonResponse({
+        'restaurants': [
+            {'id': restaurant.id, 'name': restaurant.name, 'bit': position}
+            for restaurant, position in zip(restaurants, restaurant_positions)
+        ],
+        'products': [
+            {
+                'id': product.id,
+                'name': product.name,
+                'category': product.category.name if product.category else None,
+                'price': product.price,
+                'image': product.image.url if product.image else None,
+                'availability': format(availability, 'x'),
+            }
+            for product, availability in products_with_availability
+        ],
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+@use_replica()
+def view_restaurants(request):
+    restaurants = Restaurant.objects.annotate(
+        available_items_count=count_per_restaurant(
+            RestaurantMenuItem.objects.filter(availability=True)
+        ),
+        unavailable_items_count=count_per_restaurant(
+            RestaurantMenuItem.objects.filter(availability=False)
+        ),
+        open_orders_count=count_per_restaurant(
+            Order.objects.filter(status__in=Order.UNPROCESSED_STATUSES)
+        ),
+    ).order_by('name')
 
     return render(request, template_name="restaurants_list.html", context={
         'restaurants': restaurants,
     })
 
 
+def count_per_restaurant(queryset):
+    """Count rows of the queryset per restaurant in a correlated subquery.
+
+    Unlike Count() over joins, several such counts do not multiply each
+    other's rows.
+    """
+    counts = (
+        queryset
+        .filter(restaurant=OuterRef('pk'))
+        .order_by()
+        .values('restaurant')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+@use_replica()
+def restaurant_products_api(request, restaurant_id):
+    """Return the menu of the restaurant, loaded on demand by the restaurants page."""
+    menu_items = (
+        RestaurantMenuItem.objects
+        .filter(restaurant_id=restaurant_id)
+        .order_by('product__name')
+        .values_list('product_id', 'product__name', 'product__price', 'availability')
+    )
+    return JsonResponse({
+        'products': [
+            {'id': product_id, 'name': name, 'price': price, 'available': available}
+            for product_id, name, price, available in menu_items
+        ],
+    }, json_dumps_params={'ensure_ascii': False})
+
+
 @user_passes_test(is_manager, login_url='restaurateur:login')
+@use_replica()
 def view_orders(request):
-    orders = Order.objects.prefetch_related('items').all()
-    
+    last_event_id = get_broker().get_last_event_id()
+    order_filter = OrderFilter(request.GET)
+    order_filter.is_valid()
+    filters = order_filter.cleaned_data
+    orders = list(
+        filter_orders(Order.objects.all(), filters)
+        .select_related('restaurant')
+        .prefetch_related('items')[:ORDERS_PER_PAGE + 1]
+    )
+    next_page_url = None
+    if len(orders) > ORDERS_PER_PAGE:
+        orders = orders[:ORDERS_PER_PAGE]
+        next_page_query = request.GET.copy()
+        next_page_query['cursor'] = encode_cursor(orders[-1])
+        next_page_url = f'?{next_page_query.urlencode()}'
+
+    prepare_orders(orders)
+
+    return render(request, 'order_items.html', {
+        'orders': orders,
+        'order_filter': order_filter,
+        'next_page_url': next_page_url,
+        'last_event_id': last_event_id,
+        'poll_interval': settings.ORDER_FEED_POLL_INTERVAL,
+    })
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def orders_feed(request):
+    """Return changes of orders shown on the manager orders page.
+
+    The request does not wait for new events, so an open page does not
+    hold a worker; it polls every ORDER_FEED_POLL_INTERVAL seconds.
+
+    Returns rendered rows of the changed orders matching the page filters.
+    Orders which no longer match the filters come with `html: null`.
+    """
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        return JsonResponse({'error': 'after must be an integer'}, status=400)
+
+    last_event_id, events, is_complete = get_broker().listen(after)
+    if not is_complete:
+        return JsonResponse({'reset': True, 'last_event_id': last_event_id})
+
+    order_filter = OrderFilter(request.GET)
+    order_filter.is_valid()
+    filters = {**order_filter.cleaned_data, 'cursor': None}
+    changed_order_ids = sorted({event['order_id'] for event in events})
+    orders = list(
+        filter_orders(Order.objects.filter(id__in=changed_order_ids), filters)
+        .select_related('restaurant')
+        .prefetch_related('items')
+    )
+    prepare_orders(orders)
+    rows = {
+        order.id: render_to_string('order_row.html', {'order': order}, request)
+        for order in orders
+    }
+
+    return JsonResponse({
+        'reset': False,
+        'last_event_id': last_event_id,
+        'orders': [
+            {'id': order_id, 'html': rows.get(order_id)}
+            for order_id in changed_order_ids
+        ],
+    })
+
+
+def prepare_orders(orders):
+    """Attach total price and nearest eligible restaurants to the orders."""
+    restaurants = Restaurant.objects.in_bulk()
+    restaurants_by_product = get_restaurants_by_product()
+    coordinates = get_stored_coordinates(order.address for order in orders)
+
     for order in orders:
-        order.total_price = order.calculate_total_price()
-        order.available_restaurants = get_available_restaurants(order)
-    
-    return render(request, 'order_items.html', {'orders': orders})
-
-
-def get_available_restaurants(order):
-    order_product_names = {item.product for item in order.items.all()}
-    
-    available_restaurants = Restaurant.objects.filter(
-        menu_items__product__name__in=order_product_names, 
-        menu_items__availability=True
-    ).distinct()
-    
-    return available_restaurants
+        order_items = order.items.all()
+        order.total_price = sum(
+            item.fixed_price * item.quantity for item in order_items
+        )
+        eligible_restaurant_ids = get_eligible_restaurant_ids(
+            {item.product_id for item in order_items}, restaurants_by_product
+        )
+        order.available_restaurants = [
+            (restaurants[restaurant_id], distance)
+            for restaurant_id, distance in get_nearest_restaurants(
+                coordinates.get(order.address), eligible_restaurant_ids
+            )
+        ]
+
+
+def get_nearest_restaurants(point, restaurant_ids, count=NEAREST_RESTAURANTS_COUNT):
+    """Return up to count (restaurant id, distance in km) pairs, nearest first.
+
+    Restaurants whose distance is unknown go last with None as distance.
+    """
+    nearest_restaurants = []
+    if point:
+        nearest_restaurants = restaurant_index.nearest(point, count, restaurant_ids)
+    ranked_ids = {restaurant_id for restaurant_id, _ in nearest_restaurants}
+    for restaurant_id in sorted(restaurant_ids - ranked_ids):
+        if len(nearest_restaurants) >= count:
+            break
+        nearest_restaurants.append((restaurant_id, None))
+    return nearest_restaurants
@@ -0,0 +1,59 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+
+REPLICA_DATABASE = 'replica'
+
+replica_requested = ContextVar('replica_requested', default=False)
+
+
+def get_read_database():
+    """Return alias of the replica if it is configured, else the default one."""
+    if REPLICA_DATABASE in connections.databases:
+        return REPLICA_DATABASE
+    return 'default'
+
+
+@contextmanager
+def use_replica():
+    """Route reads to the read replica inside the block or the view.
+
+    Meant for manager pages and reports which tolerate replication lag.
+    Without a configured replica reads stay on the default database.
+    """
+    token = replica_requested.set(True)
+    try:
+        yield
+    finally:
+        replica_requested.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Route reads back to the default database inside the block.
+
+    Meant for data cached under a version read from the default database,
+    which must not be built from a lagging replica.
+    """
+    token = replica_requested.set(False)
+    try:
+        yield
+    finally:
+        replica_requested.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if replica_requested.get():
+            return get_read_database()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_DATABASE
@@ -0,0 +1,85 @@
+"""Per-view request metrics kept in fixed-size histograms.
+
+Every worker process keeps its own numbers, so a scraper sees the metrics
+of the process which served the scrape request.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024)
+
+METRICS = {
+    'starburger_request_duration_seconds': ('Wall time of a request', DURATION_BUCKETS),
+    'starburger_request_db_queries': ('Database queries per request', QUERY_COUNT_BUCKETS),
+    'starburger_request_db_duration_seconds': ('Database time of a request', DURATION_BUCKETS),
+    'starburger_request_db_connections_opened': (
+        'Database connections opened per request', QUERY_COUNT_BUCKETS
+    ),
+    'starburger_response_size_bytes': ('Size of a response body', SIZE_BUCKETS),
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def iter_cumulative_counts(self):
+        total = 0
+        for bucket, count in zip(self.buckets, self.counts):
+            total += count
+            yield str(bucket), total
+        yield '+Inf', self.count
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = Lock()
+        self.histograms = {
+            name: defaultdict(lambda buckets=buckets: Histogram(buckets))
+            for name, (_, buckets) in METRICS.items()
+        }
+
+    def observe(self, view_name, **values):
+        with self.lock:
+            for name, value in values.items():
+                if value is not None:
+                    self.histograms[name][view_name].observe(value)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, (description, _) in METRICS.items():
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for view_name, histogram in sorted(self.histograms[name].items()):
+                    labels = f'view="{view_name}"'
+                    for bucket, count in histogram.iter_cumulative_counts():
+                        lines.append(f'{name}_bucket{{{labels},le="{bucket}"}} {count}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+@staff_member_required
+def metrics_view(request):
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,148 @@
+from contextvars import ContextVar
+from timeit import default_timer
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .metrics import registry
+
+request_query_counter = ContextVar('request_query_counter', default=None)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.opened_connections = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = default_timer()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += default_timer() - started_at
+
+
+def count_query(execute, sql, params, many, context):
+    """Execute wrapper reporting queries to the counter of the current request.
+
+    The counter is found through a context variable, so the queries of an
+    async view made in sync_to_async threads are counted too.
+    """
+    query_counter = request_query_counter.get()
+    if query_counter is None:
+        return execute(sql, params, many, context)
+    return query_counter(execute, sql, params, many, context)
+
+
+def install_query_counter(connection):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def count_opened_connection(sender, connection, **kwargs):
+    install_query_counter(connection)
+    query_counter = request_query_counter.get()
+    if query_counter is not None:
+        query_counter.opened_connections += 1
+
+
+# star_burger is not an app, so there is no ready() to connect it in
+connection_created.connect(count_opened_connection)
+
+
+class InstrumentationMiddleware:
+    """Record wall time, DB queries, DB time and response size per view."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for connection in connections.all():
+            install_query_counter(connection)
+        query_counter = QueryCounter()
+        token = request_query_counter.set(query_counter)
+        started_at = default_timer()
+        try:
+            response = self.get_response(request)
+        finally:
+            request_query_counter.reset(token)
+        self.observe(request, response, query_counter, default_timer() - started_at)
+        return response
+
+    async def __acall__(self, request):
+        query_counter = QueryCounter()
+        token = request_query_counter.set(query_counter)
+        started_at = default_timer()
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_query_counter.reset(token)
+        self.observe(request, response, query_counter, default_timer() - started_at)
+        return response
+
+    def observe(self, request, response, query_counter, duration):
+        resolver_match = request.resolver_match
+        view_name = resolver_match.view_name if resolver_match else 'unresolved'
+        registry.observe(
+            view_name,
+            starburger_request_duration_seconds=duration,
+            starburger_request_db_queries=query_counter.count,
+            starburger_request_db_duration_seconds=query_counter.duration,
+            starburger_request_db_connections_opened=query_counter.opened_connections,
+            starburger_response_size_bytes=(
+                None if response.streaming else len(response.content)
+            ),
+        )
+
+
+class ConnectionHealthCheckMiddleware:
+    """Drop persistent connections which the database server has closed.
+
+    Django 3.2 reuses a connection kept by CONN_MAX_AGE without checking
+    it, so a connection closed by the server, e.g. on a restart, breaks the
+    next request. Connections with CONN_HEALTH_CHECKS enabled are pinged
+    before the view runs and reopened lazily when the ping fails.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not any(
+            database.get('CONN_HEALTH_CHECKS') for database in settings.DATABASES.values()
+        ):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.check_connections()
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        # connections belong to the thread running sync code of the request
+        await sync_to_async(self.check_connections)()
+        return await self.get_response(request)
+
+    def check_connections(self):
+        for connection in connections.all():
+            if (
+                connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and connection.connection is not None
+                and not connection.is_usable()
+            ):
+                connection.close()
@@ -20,17 +20,19 @@ ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', ['127.0.0.1', 'localhost'])
 INSTALLED_APPS = [
     'foodcartapp.apps.FoodcartappConfig',
     'restaurateur.apps.RestaurateurConfig',
+    'places.apps.PlacesConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'debug_toolbar',
     'rest_framework',
 ]
 
 MIDDLEWARE = [
+    'star_burger.middleware.InstrumentationMiddleware',
+    'star_burger.middleware.ConnectionHealthCheckMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -38,9 +40,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'star_burger.urls'
 
 DEBUG_TOOLBAR_PANELS = [
@@ -81,11 +86,53 @@ WSGI_APPLICATION = 'star_burger.wsgi.application'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+DB_CONN_MAX_AGE = env.int('DB_CONN_MAX_AGE', 0)
+DB_CONN_HEALTH_CHECKS = env.bool('DB_CONN_HEALTH_CHECKS', DB_CONN_MAX_AGE > 0)
+
 DATABASES = {
     'default': dj_database_url.config(
-        default='sqlite:////{0}'.format(os.path.join(BASE_DIR, 'db.sqlite3'))
+        default='sqlite:////{0}'.format(os.path.join(BASE_DIR, 'db.sqlite3')),
+        conn_max_age=DB_CONN_MAX_AGE,
+    )
+}
+
+REPLICA_DATABASE_URL = env('REPLICA_DATABASE_URL', None)
+if REPLICA_DATABASE_URL:
+    DATABASES['replica'] = dj_database_url.parse(
+        REPLICA_DATABASE_URL,
+        conn_max_age=DB_CONN_MAX_AGE,
     )
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+for database in DATABASES.values():
+    database['CONN_HEALTH_CHECKS'] = DB_CONN_HEALTH_CHECKS
+
+DATABASE_ROUTERS = ['star_burger.db.ReplicaRouter']
+
+CACHES = {
+    'default': env.dj_cache_url('CACHE_URL', 'locmem://'),
 }
+# how long a process may serve a catalogue version without checking the
+# database, it matters when CACHE_URL is not shared between processes
+CATALOGUE_VERSION_TTL = env.int('CATALOGUE_VERSION_TTL', 5)
+
+YANDEX_GEOCODER_API_KEY = env('YANDEX_GEOCODER_API_KEY', '')
+GEOCODER_BACKEND = env(
+    'GEOCODER_BACKEND',
+    'places.geocoders.YandexGeocoder' if YANDEX_GEOCODER_API_KEY else 'places.geocoders.FileGeocoder',
+)
+GEOCODER_TIMEOUT = env.float('GEOCODER_TIMEOUT', 5)
+GEOCODER_FILE = env('GEOCODER_FILE', os.path.join(BASE_DIR, 'geocoder.json'))
+GEOCODER_CACHE_TTL = env.int('GEOCODER_CACHE_TTL', 30 * 24 * 60 * 60)
+GEOCODER_MISS_CACHE_TTL = env.int('GEOCODER_MISS_CACHE_TTL', 24 * 60 * 60)
+# how long a process may serve the restaurant index without checking the
+# database, it matters when CACHE_URL is not shared between processes
+RESTAURANT_INDEX_VERSION_TTL = env.int('RESTAURANT_INDEX_VERSION_TTL', 5)
+
+ORDER_FEED_BROKER = env('ORDER_FEED_BROKER', 'restaurateur.brokers.DatabaseBroker')
+ORDER_FEED_POLL_INTERVAL = env.int('ORDER_FEED_POLL_INTERVAL', 5)
+
+IDEMPOTENCY_KEY_TTL = env.int('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
 
 AUTH_PASSWORD_VALIDATORS = [
     {